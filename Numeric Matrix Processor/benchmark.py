@@ -0,0 +1,57 @@
+import argparse
+from array import array
+from random import Random
+from time import perf_counter
+
+import matrix
+from matrix import Matrix
+
+# Square matrix sizes, from 64 to 2048
+SIZES = [64, 128, 256, 512, 1024, 2048]
+ENGINES = {
+    "numpy": matrix.multiply_numpy,
+    "python": matrix.multiply_blocked,
+    "parallel": matrix.multiply_parallel,
+}
+
+
+def random_matrix(size: int, seed: int) -> Matrix:
+    """
+    :param size: Number of rows and columns
+    :param seed: Random seed
+    :return: Square matrix of random numbers
+    """
+    rnd = Random(seed)
+    return Matrix(size, size, array("d", (rnd.random() for _ in range(size * size))))
+
+
+def run(sizes: list, engines: list) -> None:
+    """
+    Multiplies random square matrices and prints GFLOP/s of every engine
+
+    :param sizes: Matrix sizes
+    :param engines: Names of engines from ENGINES
+    """
+    print(f"{'engine':<8}{'size':>6}{'seconds':>10}{'GFLOP/s':>10}")
+    for size in sizes:
+        m1 = random_matrix(size, 1)
+        m2 = random_matrix(size, 2)
+        for engine in engines:
+            start = perf_counter()
+            ENGINES[engine](m1, m2)
+            elapsed = perf_counter() - start
+            gflops = 2 * size**3 / elapsed / 1e9
+            print(f"{engine:<8}{size:>6}{elapsed:>10.3f}{gflops:>10.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Matrix multiplication benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument(
+        "--engines",
+        nargs="+",
+        choices=list(ENGINES),
+        default=list(ENGINES) if matrix.numpy is not None else ["python", "parallel"],
+    )
+    args = parser.parse_args()
+    run(args.sizes, args.engines)
@@ -0,0 +1,177 @@
+from array import array
+from operator import mul
+
+from matrix import inverse, Matrix, multiply
+from sparse import optimal, SparseMatrix, to_dense
+
+
+class Expression:
+    """
+    Node of a lazy expression graph. Operations only build the graph,
+    evaluate() computes it once. Scalar factors are collected into
+    linear combinations, transposes are moved down to the operands where
+    they are free views, so transpose + scale + add is a single pass
+    """
+
+    value = None
+
+    def evaluate(self):
+        """
+        Computes the expression, the result is cached
+
+        :return: Matrix or SparseMatrix
+        """
+        if self.value is None:
+            self.value = self.compute()
+        return self.value
+
+    def compute(self):
+        """
+        Computes the node from evaluated children
+        """
+        raise NotImplementedError
+
+    def terms(self) -> list:
+        """
+        :return: Expression as a list of (coefficient, expression) pairs
+        """
+        return [(1.0, self)]
+
+    def scale(self, const: float) -> "Expression":
+        """
+        :param const:
+        :return: Expression multiplied by a constant
+        """
+        return Combination([(const * coef, expr) for coef, expr in self.terms()])
+
+    def add(self, other: "Expression") -> "Expression":
+        """
+        :param other:
+        :return: Sum of expressions
+        """
+        return Combination(self.terms() + other.terms())
+
+    def transpose(self, trans_type: str = "1") -> "Expression":
+        """
+        :param trans_type: Kind of transposing, one of TRANSPOSE_TYPES
+        :return: Transposed expression
+        """
+        return Transpose(self, trans_type)
+
+    def multiply(self, other: "Expression") -> "Expression":
+        """
+        :param other:
+        :return: Product of expressions
+        """
+        # Scalar factors are applied to the product, not to the operands
+        (coef_1, expr_1), (coef_2, expr_2) = self.factor(), other.factor()
+        return Product(expr_1, expr_2).scale(coef_1 * coef_2)
+
+    def inverse(self) -> "Expression":
+        """
+        :return: Inverse of the expression
+        """
+        return Inverse(self)
+
+    def factor(self) -> tuple:
+        """
+        :return: (coefficient, expression without scalar factor)
+        """
+        terms = self.terms()
+        return terms[0] if len(terms) == 1 else (1.0, self)
+
+    def __add__(self, other: "Expression") -> "Expression":
+        return self.add(other)
+
+    def __mul__(self, const: float) -> "Expression":
+        return self.scale(const)
+
+    __rmul__ = __mul__
+
+    def __matmul__(self, other: "Expression") -> "Expression":
+        return self.multiply(other)
+
+
+class Leaf(Expression):
+    def __init__(self, matrix):
+        self.matrix = matrix
+
+    def compute(self):
+        return self.matrix
+
+
+class Transpose(Expression):
+    def __init__(self, expr: Expression, trans_type: str):
+        self.expr = expr
+        self.trans_type = trans_type
+
+    def compute(self):
+        return self.expr.evaluate().transpose(self.trans_type)
+
+
+class Product(Expression):
+    def __init__(self, left: Expression, right: Expression):
+        self.left = left
+        self.right = right
+
+    def compute(self):
+        left, right = self.left.evaluate(), self.right.evaluate()
+        if isinstance(left, SparseMatrix) and isinstance(right, SparseMatrix):
+            return optimal(left.multiply(right))
+        return multiply(to_dense(left), to_dense(right))
+
+
+class Inverse(Expression):
+    def __init__(self, expr: Expression):
+        self.expr = expr
+
+    def compute(self):
+        return inverse(to_dense(self.expr.evaluate()))
+
+
+class Combination(Expression):
+    """
+    Sum of scaled expressions
+    """
+
+    def __init__(self, items: list):
+        self.items = items
+
+    def terms(self) -> list:
+        return list(self.items)
+
+    def transpose(self, trans_type: str = "1") -> Expression:
+        return Combination(
+            [(coef, expr.transpose(trans_type)) for coef, expr in self.items]
+        )
+
+    def compute(self):
+        coefs = [coef for coef, _ in self.items]
+        matrices = [expr.evaluate() for _, expr in self.items]
+        shape = matrices[0].shape
+        if any(matrix.shape != shape for matrix in matrices):
+            raise ValueError("Matrix sizes don't match")
+        if coefs == [1.0]:
+            return matrices[0]
+        if all(isinstance(matrix, SparseMatrix) for matrix in matrices):
+            result = matrices[0].scale(coefs[0])
+            for coef, matrix in zip(coefs[1:], matrices[1:]):
+                result = result.add(matrix.scale(coef))
+            return result
+        # One strided pass over all operands, views are not copied
+        columns = zip(*(to_dense(matrix).values() for matrix in matrices))
+        if len(coefs) == 1:
+            data = array("d", [coefs[0] * x for (x,) in columns])
+        else:
+            data = array("d", [sum(map(mul, coefs, column)) for column in columns])
+        return Matrix(shape[0], shape[1], data)
+
+
+def lazy(matrix) -> Expression:
+    """
+    Starts an expression graph from the matrix
+
+    :param matrix: Matrix or SparseMatrix
+    :return: Expression
+    """
+    return Leaf(matrix)
@@ -0,0 +1,475 @@
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from operator import mul
+import os
+import sys
+from typing import Iterator
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Kinds of transposing: main diagonal, side diagonal, vertical and horizontal line
+TRANSPOSE_TYPES = ("1", "2", "3", "4")
+# Size of result tiles in pure Python multiplication
+BLOCK_SIZE = 64
+# Pure Python products with more multiplications are computed by a process pool
+PARALLEL_THRESHOLD = 256**3
+
+
+class Matrix:
+    """
+    Matrix stored in a flat array of doubles. Element [i, j] is
+    data[offset + i * strides[0] + j * strides[1]], so transposed and
+    flipped matrices are views sharing the same data
+    """
+
+    def __init__(
+        self,
+        rows: int,
+        cols: int,
+        data: array = None,
+        offset: int = 0,
+        strides: tuple = None,
+    ):
+        self.rows = rows
+        self.cols = cols
+        self.data = array("d", bytes(8 * rows * cols)) if data is None else data
+        self.offset = offset
+        self.strides = (cols, 1) if strides is None else strides
+
+    @classmethod
+    def from_rows(cls, rows: list) -> "Matrix":
+        """
+        Creates matrix from the list of rows
+
+        :param rows: [[1, 2], [3, 4]...]
+        :return: New matrix
+        """
+        data = array("d")
+        for row in rows:
+            data.extend(row)
+        return cls(len(rows), len(rows[0]) if rows else 0, data)
+
+    @property
+    def shape(self) -> tuple:
+        return self.rows, self.cols
+
+    @property
+    def is_contiguous(self) -> bool:
+        """
+        True if data holds exactly the matrix elements in row-major order
+        """
+        return (
+            self.offset == 0
+            and self.strides == (self.cols, 1)
+            and len(self.data) == self.rows * self.cols
+        )
+
+    def __getitem__(self, idx: tuple) -> float:
+        i, j = idx
+        return self.data[self.offset + i * self.strides[0] + j * self.strides[1]]
+
+    def __setitem__(self, idx: tuple, value: float) -> None:
+        i, j = idx
+        self.data[self.offset + i * self.strides[0] + j * self.strides[1]] = value
+
+    def row(self, i: int) -> array:
+        """
+        Copies the row of the matrix
+
+        :param i: Row index
+        :return: Row values
+        """
+        row_stride, col_stride = self.strides
+        start = self.offset + i * row_stride
+        end = start + self.cols * col_stride
+        # Slice of a flipped row ends before the first element
+        return self.data[start : end if end >= 0 else None : col_stride]
+
+    def column(self, j: int) -> array:
+        """
+        Copies the column of the matrix
+
+        :param j: Column index
+        :return: Column values
+        """
+        return self.transpose("1").row(j)
+
+    def __iter__(self) -> Iterator[array]:
+        for i in range(self.rows):
+            yield self.row(i)
+
+    def values(self) -> Iterator[float]:
+        """
+        Iterates over all elements in row-major order
+        """
+        if self.is_contiguous:
+            return iter(self.data)
+        return (value for row in self for value in row)
+
+    def tolist(self) -> list:
+        """
+        :return: Matrix as list of rows (lists as well) ([[1, 2], [3, 4]...])
+        """
+        return [row.tolist() for row in self]
+
+    def copy(self) -> "Matrix":
+        """
+        :return: Contiguous copy of the matrix
+        """
+        return Matrix(self.rows, self.cols, array("d", self.values()))
+
+    def contiguous(self) -> "Matrix":
+        """
+        :return: The matrix itself if it's contiguous, its copy otherwise
+        """
+        return self if self.is_contiguous else self.copy()
+
+    def transpose(self, trans_type: str = "1") -> "Matrix":
+        """
+        Transposes matrix by specified way without copying the data
+
+        :param trans_type: Kind of transposing, one of TRANSPOSE_TYPES
+        :return: View of the transposed matrix
+        """
+        row_stride, col_stride = self.strides
+        last_row = (self.rows - 1) * row_stride
+        last_col = (self.cols - 1) * col_stride
+        # Main diagonal
+        if trans_type == "1":
+            return Matrix(
+                self.cols, self.rows, self.data, self.offset, (col_stride, row_stride)
+            )
+        # Side diagonal
+        if trans_type == "2":
+            return Matrix(
+                self.cols,
+                self.rows,
+                self.data,
+                self.offset + last_row + last_col,
+                (-col_stride, -row_stride),
+            )
+        # Vertical line
+        if trans_type == "3":
+            return Matrix(
+                self.rows,
+                self.cols,
+                self.data,
+                self.offset + last_col,
+                (row_stride, -col_stride),
+            )
+        # Horizontal line
+        if trans_type == "4":
+            return Matrix(
+                self.rows,
+                self.cols,
+                self.data,
+                self.offset + last_row,
+                (-row_stride, col_stride),
+            )
+        raise ValueError(f"Unknown transpose type: {trans_type}")
+
+
+class LU:
+    """
+    LU decomposition with partial pivoting: rows of the matrix permuted by
+    perm are equal to L * U. L has unit diagonal, both are stored in lu.
+    Matrix is treated as singular by solve and inverse if a pivot is not
+    bigger than tolerance, by default n * eps * max|a_ij| to hide round-off
+    errors of elimination. Determinant is zero only if a pivot is exactly zero
+    """
+
+    def __init__(self, matrix: Matrix, tolerance: float = None):
+        if matrix.rows != matrix.cols:
+            raise ValueError("Matrix is not square")
+        size = matrix.rows
+        rows = [row.tolist() for row in matrix]
+        if tolerance is None:
+            scale = max((abs(x) for row in rows for x in row), default=0.0)
+            tolerance = size * sys.float_info.epsilon * scale
+        self.perm = list(range(size))
+        self.sign = 1
+        self.singular = False
+        self.zero_pivot = False
+        for k in range(size):
+            pivot = max(range(k, size), key=lambda i: abs(rows[i][k]))
+            if abs(rows[pivot][k]) <= tolerance:
+                self.singular = True
+            if not rows[pivot][k]:
+                self.zero_pivot = True
+                continue
+            if pivot != k:
+                rows[k], rows[pivot] = rows[pivot], rows[k]
+                self.perm[k], self.perm[pivot] = self.perm[pivot], self.perm[k]
+                self.sign = -self.sign
+            pivot_value = rows[k][k]
+            pivot_tail = rows[k][k + 1 :]
+            for row in rows[k + 1 :]:
+                factor = row[k] / pivot_value
+                row[k] = factor
+                if factor:
+                    row[k + 1 :] = [
+                        x - factor * y for x, y in zip(row[k + 1 :], pivot_tail)
+                    ]
+        self.lu = Matrix.from_rows(rows)
+
+    def determinant(self) -> float:
+        """
+        :return: Determinant of the decomposed matrix
+        """
+        if self.zero_pivot:
+            return 0.0
+        result = float(self.sign)
+        for i in range(self.lu.rows):
+            result *= self.lu[i, i]
+        return result
+
+    def solve(self, b: Matrix) -> Matrix:
+        """
+        Solves A * X = B by forward and back substitution
+
+        :param b: Right-hand side, one system per column
+        :return: X
+        """
+        if self.singular:
+            raise ValueError("Matrix is singular")
+        size = self.lu.rows
+        if b.rows != size:
+            raise ValueError("Matrix sizes don't match")
+        lu_rows = self.lu.tolist()
+        rows = [b.row(i).tolist() for i in self.perm]
+        # L * Y = P * B, L has unit diagonal
+        for i in range(size):
+            row = rows[i]
+            for k in range(i):
+                factor = lu_rows[i][k]
+                if factor:
+                    row = [x - factor * y for x, y in zip(row, rows[k])]
+            rows[i] = row
+        # U * X = Y
+        for i in reversed(range(size)):
+            row = rows[i]
+            for k in range(i + 1, size):
+                factor = lu_rows[i][k]
+                if factor:
+                    row = [x - factor * y for x, y in zip(row, rows[k])]
+            pivot = lu_rows[i][i]
+            rows[i] = [x / pivot for x in row]
+        return Matrix.from_rows(rows) if rows else Matrix(0, b.cols)
+
+    def inverse(self) -> Matrix:
+        """
+        :return: Inverse of the decomposed matrix
+        """
+        size = self.lu.rows
+        identity = Matrix(size, size)
+        for i in range(size):
+            identity[i, i] = 1
+        return self.solve(identity)
+
+
+def bareiss_determinant(matrix) -> int:
+    """
+    Calculates determinant of an integer matrix by fraction-free Bareiss
+    elimination in O(n^3), all divisions are exact, so the result is exact
+
+    :param matrix: Square matrix with integer elements
+    :return: Determinant
+    """
+    if matrix.rows != matrix.cols:
+        raise ValueError("Matrix is not square")
+    size = matrix.rows
+    rows = [[int(x) for x in row] for row in matrix]
+    sign = 1
+    prev_pivot = 1
+    for k in range(size - 1):
+        if not rows[k][k]:
+            swap = next((i for i in range(k + 1, size) if rows[i][k]), None)
+            if swap is None:
+                return 0
+            rows[k], rows[swap] = rows[swap], rows[k]
+            sign = -sign
+        pivot = rows[k][k]
+        pivot_tail = rows[k][k + 1 :]
+        for row in rows[k + 1 :]:
+            factor = row[k]
+            row[k + 1 :] = [
+                (x * pivot - factor * y) // prev_pivot
+                for x, y in zip(row[k + 1 :], pivot_tail)
+            ]
+        prev_pivot = pivot
+    return sign * rows[-1][-1] if size else 1
+
+
+def is_integer_matrix(matrix) -> bool:
+    """
+    :param matrix: Dense or sparse matrix
+    :return: True if all elements are integers
+    """
+    return all(x.is_integer() for x in matrix.values())
+
+
+def inverse(matrix: Matrix) -> Matrix:
+    """
+    Inverts matrix by LU decomposition
+
+    :param matrix: Square matrix
+    :return: Inverse matrix
+    """
+    return LU(matrix).inverse()
+
+
+def solve(a: Matrix, b: Matrix) -> Matrix:
+    """
+    Solves system of linear equations A * X = B without inverting A
+
+    :param a: Square matrix of coefficients
+    :param b: Right-hand side, one system per column
+    :return: X
+    """
+    return LU(a).solve(b)
+
+
+def multiply_numpy(m1: Matrix, m2: Matrix) -> Matrix:
+    """
+    Multiplies matrices with NumPy, operands are shared with NumPy arrays
+
+    :param m1:
+    :param m2:
+    :return: m1 * m2
+    """
+    m1 = m1.contiguous()
+    m2 = m2.contiguous()
+    a = numpy.frombuffer(m1.data, dtype=numpy.float64).reshape(m1.shape)
+    b = numpy.frombuffer(m2.data, dtype=numpy.float64).reshape(m2.shape)
+    data = array("d")
+    data.frombytes((a @ b).tobytes())
+    return Matrix(m1.rows, m2.cols, data)
+
+
+def multiply_blocked(m1: Matrix, m2: Matrix) -> Matrix:
+    """
+    Multiplies matrices in pure Python. Columns of m2 are copied once,
+    so every element is a dot product of two sequential lists, and the
+    result is computed in BLOCK_SIZE x BLOCK_SIZE tiles to reuse the
+    columns of a tile while they are in cache
+
+    :param m1:
+    :param m2:
+    :return: m1 * m2
+    """
+    rows, cols = m1.rows, m2.cols
+    m1_rows = [row.tolist() for row in m1]
+    m2_cols = [m2.column(j).tolist() for j in range(cols)]
+    data = array("d", bytes(8 * rows * cols))
+    for col_start in range(0, cols, BLOCK_SIZE):
+        cols_block = m2_cols[col_start : col_start + BLOCK_SIZE]
+        col_end = col_start + len(cols_block)
+        for row_start in range(0, rows, BLOCK_SIZE):
+            for i in range(row_start, min(row_start + BLOCK_SIZE, rows)):
+                m1_row = m1_rows[i]
+                data[i * cols + col_start : i * cols + col_end] = array(
+                    "d", [sum(map(mul, m1_row, col)) for col in cols_block]
+                )
+    return Matrix(rows, cols, data)
+
+
+def to_shared_memory(matrix: Matrix) -> SharedMemory:
+    """
+    Copies matrix elements in row-major order to a new shared memory block
+
+    :param matrix:
+    :return: Shared memory block, caller has to close and unlink it
+    """
+    data = matrix.contiguous().data
+    block = SharedMemory(create=True, size=max(8 * len(data), 1))
+    block.buf[: 8 * len(data)] = memoryview(data).cast("B")
+    return block
+
+
+def multiply_rows(names: tuple, inner: int, cols: int, start: int, end: int) -> None:
+    """
+    Computes rows from start to end of the product in shared memory,
+    runs in a worker process
+
+    :param names: Names of shared memory blocks with m1, transposed m2 and result
+    :param inner: Number of m1 columns
+    :param cols: Number of m2 columns
+    :param start: First row to compute
+    :param end: Row after the last one to compute
+    """
+    blocks = [SharedMemory(name=name) for name in names]
+    m1_data, m2_cols_data, result = (block.buf.cast("d") for block in blocks)
+    try:
+        m2_cols = [
+            m2_cols_data[j * inner : (j + 1) * inner].tolist() for j in range(cols)
+        ]
+        for i in range(start, end):
+            m1_row = m1_data[i * inner : (i + 1) * inner].tolist()
+            result[i * cols : (i + 1) * cols] = array(
+                "d", [sum(map(mul, m1_row, col)) for col in m2_cols]
+            )
+    finally:
+        # Views have to be released before the blocks are closed
+        for view in (m1_data, m2_cols_data, result):
+            view.release()
+        for block in blocks:
+            block.close()
+
+
+def multiply_parallel(m1: Matrix, m2: Matrix, workers: int = None) -> Matrix:
+    """
+    Multiplies matrices by blocks of rows in a process pool. Operands and
+    result are placed in shared memory, so they are not pickled per task
+
+    :param m1:
+    :param m2:
+    :param workers: Number of processes, all CPU cores by default
+    :return: m1 * m2
+    """
+    rows, inner, cols = m1.rows, m1.cols, m2.cols
+    workers = workers or os.cpu_count()
+    blocks = [to_shared_memory(m1), to_shared_memory(m2.transpose("1"))]
+    blocks.append(SharedMemory(create=True, size=max(8 * rows * cols, 1)))
+    try:
+        names = tuple(block.name for block in blocks)
+        # Several blocks per worker even out the load
+        step = max(1, -(-rows // (4 * workers)))
+        starts = range(0, rows, step)
+        with ProcessPoolExecutor(workers) as executor:
+            tasks = [
+                executor.submit(
+                    multiply_rows, names, inner, cols, start, min(start + step, rows)
+                )
+                for start in starts
+            ]
+            for task in tasks:
+                task.result()
+        data = array("d")
+        data.frombytes(blocks[2].buf[: 8 * rows * cols])
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+    return Matrix(rows, cols, data)
+
+
+def multiply(m1: Matrix, m2: Matrix) -> Matrix:
+    """
+    Multiplies matrices with NumPy if it's installed, in pure Python otherwise.
+    Big pure Python products are computed on all CPU cores
+
+    :param m1:
+    :param m2:
+    :return: m1 * m2
+    """
+    if m1.cols != m2.rows:
+        raise ValueError("Matrix sizes don't match")
+    if numpy is not None:
+        return multiply_numpy(m1, m2)
+    if m1.rows * m1.cols * m2.cols >= PARALLEL_THRESHOLD and (os.cpu_count() or 1) > 1:
+        return multiply_parallel(m1, m2)
+    return multiply_blocked(m1, m2)
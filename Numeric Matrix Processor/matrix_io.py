@@ -0,0 +1,210 @@
+from array import array
+from ast import literal_eval
+import mmap
+import re
+import struct
+import sys
+from typing import BinaryIO, Iterator, TextIO
+
+from matrix import Matrix
+
+NPY_MAGIC = b"\x93NUMPY"
+# Byte order mark of doubles in .npy header for this machine
+NPY_DESCR = "<f8" if sys.byteorder == "little" else ">f8"
+# Number of rows formatted and written at once
+CHUNK_ROWS = 512
+# Zero fraction of a number formatted with "%.3f", and zero with minus sign
+ZERO_FRACTION = re.compile(r"\.?0+(?=[ \n])")
+NEGATIVE_ZERO = re.compile(r"(?<![\d.])-0(?=[ \n])")
+# From this magnitude "%.3f" shows digits beyond the precision of a double
+ROUNDED_FORMAT_LIMIT = 2.0**42
+
+
+def num_to_str(num: float) -> str:
+    """
+    Converts number to string, considering the number type
+
+    :param num: Number to convert
+    :return: Resulting string
+    """
+    # Round first to hide floating point errors like 2.9999999999999996
+    num = round(num, 3)
+    if num == int(num):
+        return str(int(num))
+    else:
+        return str(num)
+
+
+def read_text(text_file: TextIO) -> Matrix:
+    """
+    Reads matrix row by row, numbers in a row are separated by whitespace
+
+    :param text_file: Opened text file
+    :return: Matrix
+    """
+    data = array("d")
+    rows = 0
+    cols = 0
+    for line in text_file:
+        if line.strip():
+            data.extend(map(float, line.split()))
+            rows += 1
+            if rows == 1:
+                cols = len(data)
+            elif len(data) != rows * cols:
+                raise ValueError("Rows have different length")
+    return Matrix(rows, cols, data)
+
+
+def format_rows(matrix: Matrix, row_format: str) -> Iterator[str]:
+    """
+    Formats the whole row by one % operation and joins CHUNK_ROWS rows at once
+
+    :param matrix:
+    :param row_format: Format of a number, repeated for every column
+    :return: Generator of formatted chunks
+    """
+    row_format = " ".join([row_format] * matrix.cols) + "\n"
+    chunk = []
+    for row in matrix:
+        chunk.append(row_format % tuple(row))
+        if len(chunk) == CHUNK_ROWS:
+            yield "".join(chunk)
+            chunk = []
+    if chunk:
+        yield "".join(chunk)
+
+
+def write_text(matrix: Matrix, text_file: TextIO) -> None:
+    """
+    Writes matrix row by row, numbers are written with full precision
+
+    :param matrix:
+    :param text_file: Opened text file
+    """
+    text_file.writelines(format_rows(matrix, "%r"))
+
+
+def write_rounded(matrix: Matrix, text_file: TextIO) -> None:
+    """
+    Writes matrix row by row like num_to_str formats numbers: rounded to
+    3 digits after the point, integers without fraction. Matrices with
+    elements from ROUNDED_FORMAT_LIMIT are formatted by num_to_str itself
+
+    :param matrix:
+    :param text_file: Opened text file
+    """
+    if max(map(abs, matrix.values()), default=0.0) >= ROUNDED_FORMAT_LIMIT:
+        text_file.writelines(" ".join(map(num_to_str, row)) + "\n" for row in matrix)
+        return
+    for chunk in format_rows(matrix, "%.3f"):
+        chunk = ZERO_FRACTION.sub("", chunk)
+        text_file.write(NEGATIVE_ZERO.sub("0", chunk))
+
+
+def write_binary(matrix: Matrix, binary_file: BinaryIO) -> None:
+    """
+    Writes matrix elements as raw doubles in row-major order
+
+    :param matrix:
+    :param binary_file: Opened binary file
+    """
+    if matrix.is_contiguous:
+        binary_file.write(matrix.data)
+        return
+    chunk = array("d")
+    for idx, row in enumerate(matrix, 1):
+        chunk.extend(row)
+        if idx % CHUNK_ROWS == 0:
+            binary_file.write(chunk)
+            chunk = array("d")
+    binary_file.write(chunk)
+
+
+def read_npy(file_name: str, memory_map: bool = True) -> Matrix:
+    """
+    Reads 2-D array of doubles in NumPy .npy format
+
+    :param file_name:
+    :param memory_map: Map file to memory instead of reading it,
+        changes of the matrix are not written to the file
+    :return: Matrix
+    """
+    with open(file_name, "rb") as binary_file:
+        if binary_file.read(6) != NPY_MAGIC:
+            raise ValueError(f"{file_name} is not a .npy file")
+        major_version = binary_file.read(2)[0]
+        length_format = "<H" if major_version == 1 else "<I"
+        (header_length,) = struct.unpack(
+            length_format, binary_file.read(struct.calcsize(length_format))
+        )
+        header = literal_eval(binary_file.read(header_length).decode("latin1"))
+        offset = binary_file.tell()
+        if header["descr"] not in ("<f8", ">f8") or len(header["shape"]) != 2:
+            raise ValueError("Only 2-D arrays of doubles are supported")
+        rows, cols = header["shape"]
+        if memory_map and header["descr"] == NPY_DESCR and rows * cols:
+            mapped = mmap.mmap(binary_file.fileno(), 0, access=mmap.ACCESS_COPY)
+            data = memoryview(mapped)[offset : offset + 8 * rows * cols].cast("d")
+        else:
+            data = array("d")
+            data.frombytes(binary_file.read(8 * rows * cols))
+            if header["descr"] != NPY_DESCR:
+                data.byteswap()
+    if header["fortran_order"]:
+        return Matrix(rows, cols, data, 0, (1, rows))
+    return Matrix(rows, cols, data)
+
+
+def write_npy(matrix: Matrix, file_name: str) -> None:
+    """
+    Writes matrix in NumPy .npy format (version 1.0)
+
+    :param matrix:
+    :param file_name:
+    """
+    header = (
+        f"{{'descr': '{NPY_DESCR}', 'fortran_order': False, "
+        f"'shape': ({matrix.rows}, {matrix.cols}), }}"
+    )
+    # Data starts at a multiple of 64 bytes, header ends with a newline
+    padding = -(len(NPY_MAGIC) + 4 + len(header) + 1) % 64
+    header += " " * padding + "\n"
+    with open(file_name, "wb") as binary_file:
+        binary_file.write(NPY_MAGIC + b"\x01\x00")
+        binary_file.write(struct.pack("<H", len(header)))
+        binary_file.write(header.encode("latin1"))
+        write_binary(matrix, binary_file)
+
+
+def load(file_name: str) -> Matrix:
+    """
+    Reads matrix from .npy or text file depending on file extension
+
+    :param file_name:
+    :return: Matrix
+    """
+    if file_name.endswith(".npy"):
+        return read_npy(file_name)
+    with open(file_name, "r", encoding="utf-8") as text_file:
+        return read_text(text_file)
+
+
+def save(matrix: Matrix, file_name: str) -> None:
+    """
+    Writes matrix to .npy, raw binary (.bin) or text file depending on
+    file extension, "-" writes text to stdout
+
+    :param matrix:
+    :param file_name:
+    """
+    if file_name == "-":
+        write_text(matrix, sys.stdout)
+    elif file_name.endswith(".npy"):
+        write_npy(matrix, file_name)
+    elif file_name.endswith(".bin"):
+        with open(file_name, "wb") as binary_file:
+            write_binary(matrix, binary_file)
+    else:
+        with open(file_name, "w", encoding="utf-8") as text_file:
+            write_text(matrix, text_file)
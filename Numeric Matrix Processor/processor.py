@@ -1,82 +1,110 @@
-def num_to_str(num: float) -> str:
-    """
-    Converts number to string, considering the number type
-
-    :param num: Number to convert
-    :return: Resulting string
-    """
-    if num == int(num):
-        return str(int(num))
-    else:
-        return str(round(num, 3))
-
-
-def input_matrix(matrix_num="") -> list:
+import argparse
+from array import array
+from operator import add
+import sys
+
+from matrix import (
+    bareiss_determinant,
+    inverse,
+    is_integer_matrix,
+    LU,
+    Matrix,
+    multiply,
+    TRANSPOSE_TYPES,
+)
+import matrix_io
+from expression import lazy
+from sparse import optimal, SparseMatrix, to_dense
+
+# Biggest integer matrix which determinant is calculated exactly by Bareiss
+# elimination, its big integer arithmetic is too slow for bigger ones
+EXACT_DET_SIZE = 16
+
+
+def input_matrix(matrix_num="") -> Matrix:
     """
     Gets matrix from user's input
 
     :param matrix_num: Number of matrix to input ("first", "second"...)
-    :return: Matrix as list of rows (lists as well) ([[1, 2], [3, 4]...])
+    :return: Matrix, sparse if most elements are zeros
     """
     if matrix_num:
         matrix_num += " "
     rows, cols = map(int, input(f"Enter size of {matrix_num}matrix: ").split())
-    matrix = []
+    data = array("d")
     print(f"Enter {matrix_num}matrix:")
     for _ in range(rows):
-        matrix.append(list(map(float, input().split()[:cols])))
-    return matrix
+        data.extend(map(float, input().split()[:cols]))
+    return optimal(Matrix(rows, cols, data))
 
 
-def print_matrix(matrix: list) -> None:
+def print_matrix(matrix: Matrix) -> None:
     """
     Outputs the result
 
     :param matrix: Matrix to print
     """
     print("The result is:")
-    for row in matrix:
-        print(" ".join(map(num_to_str, row)))
+    matrix_io.write_rounded(matrix, sys.stdout)
+
+
+def sum_matrices(m1: Matrix, m2: Matrix) -> Matrix:
+    """
+    Adds matrix m1 to m2
+
+    :param m1:
+    :param m2:
+    :return: Resulting matrix
+    """
+    if m1.shape != m2.shape:
+        raise ValueError("Matrix sizes don't match")
+    if isinstance(m1, SparseMatrix) and isinstance(m2, SparseMatrix):
+        return m1.add(m2)
+    data = array("d", map(add, m1.values(), m2.values()))
+    return Matrix(m1.rows, m1.cols, data)
 
 
-def add_matrices(m1: list, m2: list) -> None:
+def add_matrices(m1: Matrix, m2: Matrix) -> None:
     """
     Adds matrix m1 to m2 and prints the result
 
     :param m1:
     :param m2:
     """
-    matrix_s = []
-    if len(m1) == len(m2) and len(m1[0]) == len(m2[0]):
-        for row_idx in range(len(m1)):
-            matrix_s.append([x + y for x, y in zip(m1[row_idx], m2[row_idx])])
-        print_matrix(matrix_s)
+    if m1.shape == m2.shape:
+        print_matrix(sum_matrices(m1, m2))
     else:
         print("The operation cannot be performed.")
 
 
-def mul_matrices(m1: list, m2: list) -> None:
+def mul_matrices(m1: Matrix, m2: Matrix) -> None:
     """
     Multiplies matrix m1 by m2 and prints the result
 
     :param m1:
     :param m2:
     """
-    matrix_p = []
-    if len(m1[0]) == len(m2):
-        for m1_row_idx in range(len(m1)):
-            matrix_p.append([])
-            for m2_col_idx in range(len(m2[0])):
-                sum_ = 0
-                for m1_col_idx in range(len(m1[0])):
-                    sum_ += m1[m1_row_idx][m1_col_idx] * m2[m1_col_idx][m2_col_idx]
-                matrix_p[m1_row_idx].append(sum_)
-        print_matrix(matrix_p)
+    if m1.cols == m2.rows:
+        print_matrix(product(m1, m2))
     else:
         print("The operation cannot be performed.")
 
 
-def mul_matrix_by_const(matrix: list, const: float) -> list:
+def product(m1: Matrix, m2: Matrix) -> Matrix:
+    """
+    Multiplies matrix m1 by m2, two sparse matrices are multiplied
+    without touching zeros
+
+    :param m1:
+    :param m2:
+    :return: Resulting matrix
+    """
+    if isinstance(m1, SparseMatrix) and isinstance(m2, SparseMatrix):
+        return optimal(m1.multiply(m2))
+    return multiply(to_dense(m1), to_dense(m2))
+
+
+def mul_matrix_by_const(matrix: Matrix, const: float) -> Matrix:
     """
     Multiplies matrix by a constant
 
@@ -84,104 +112,68 @@ def mul_matrix_by_const(matrix: list, const: float) -> list:
     :param const:
     :return: Resulting matrix
     """
-    matrix_p = []
-    for row in matrix:
-        matrix_p.append([const * x for x in row])
-    return matrix_p
+    if isinstance(matrix, SparseMatrix):
+        return matrix.scale(const)
+    data = array("d", [const * x for x in matrix.values()])
+    return Matrix(matrix.rows, matrix.cols, data)
 
 
-def transpose_matrix(matrix: list, trans_type: str) -> list:
+def transpose_matrix(matrix: Matrix, trans_type: str) -> Matrix:
     """
-    Transposes matrix by specified way
+    Transposes matrix by specified way, dense result shares data with the original
 
     :param matrix: Original matrix
     :param trans_type: Kind of transposing
     :return: Transposed matrix
     """
-    matrix_t = []
-    # Main diagonal
-    if trans_type == "1":
-        matrix_t = [row for row in zip(*matrix)]
-    # Side diagonal
-    elif trans_type == "2":
-        matrix_t = reversed([reversed(row) for row in zip(*matrix)])
-    # Vertical line
-    elif trans_type == "3":
-        matrix_t = [reversed(row) for row in matrix]
-    # Horizontal line
-    elif trans_type == "4":
-        matrix_t = reversed(matrix)
-    return matrix_t
+    return matrix.transpose(trans_type)
 
 
-def cofactor(matrix: list, i: int, j: int) -> float:
+def determinant(matrix) -> float:
     """
-    Returns cofactor for matrix[i,j] element
-
-    :param matrix:
-    :param i:
-    :param j:
-    :return:
-    """
-    minor = []
-    for row_idx, row in enumerate(matrix):
-        if row_idx == i:
-            continue
-        minor.append(row[0:j] + row[j + 1 :])
-    return pow(-1, i + j) * calculate_determinant(minor)
-
+    Calculates determinant in O(n^3): sparse matrices by sparse LU
+    decomposition, small integer matrices exactly by Bareiss elimination,
+    other ones by dense LU decomposition
 
-def calculate_determinant(matrix: list) -> float:
-    """
-    Recursive function for determinant calculation
-
-    :param matrix:
+    :param matrix: Square matrix, dense or sparse
     :return: Determinant
     """
-    # 1 x 1 matrix case
-    if len(matrix) == 1:
-        return matrix[0][0]
-    # 2 x 2 matrix case
-    if len(matrix) == 2:
-        return matrix[0][0] * matrix[1][1] - matrix[0][1] * matrix[1][0]
-    # all bigger matrices
-    determinant = 0
-    calc_row = 0  # calculate for the first row
-    for idx, x in enumerate(matrix[calc_row]):
-        determinant += x * cofactor(matrix, calc_row, idx)
-    return determinant
+    if isinstance(matrix, SparseMatrix):
+        return matrix.determinant()
+    if matrix.rows <= EXACT_DET_SIZE and is_integer_matrix(matrix):
+        try:
+            return float(bareiss_determinant(matrix))
+        except OverflowError:
+            pass
+    return LU(matrix).determinant()
 
 
-def matrix_determinant(matrix: list) -> None:
+def matrix_determinant(matrix: Matrix) -> None:
     """
     Calculates matrix determinant and prints the result
 
     :param matrix:
     :return:
     """
-    if len(matrix) == len(matrix[0]):
-        print(f"The result is:\n{calculate_determinant(matrix)}")
+    if matrix.rows == matrix.cols:
+        print(f"The result is:\n{determinant(matrix)}")
     else:
         print("The operation cannot be performed.")
 
 
-def matrix_inverse(matrix: list) -> None:
+def matrix_inverse(matrix: Matrix) -> None:
     """
     Print matrix inverse if it exists
 
     :param matrix:
     :return:
     """
-    det = calculate_determinant(matrix)
-    if det != 0:
-        c_matrix = []
-        for i in range(len(matrix)):
-            c_row = []
-            for j in range(len(matrix[i])):
-                c_row.append(cofactor(matrix, i, j))
-            c_matrix.append(c_row)
-        print_matrix(mul_matrix_by_const(transpose_matrix(c_matrix, "1"), 1 / det))
-    else:
+    if matrix.rows != matrix.cols:
+        print("The operation cannot be performed.")
+        return
+    try:
+        print_matrix(inverse(to_dense(matrix)))
+    except ValueError:
         print("This matrix doesn't have an inverse")
 
 
@@ -225,7 +217,10 @@ def menu() -> None:
         print("4. Horizontal line")
         choice_t = input("Your choice: ")
         matrix_1 = input_matrix()
-        print_matrix(transpose_matrix(matrix_1, choice_t))
+        if choice_t in TRANSPOSE_TYPES:
+            print_matrix(transpose_matrix(matrix_1, choice_t))
+        else:
+            print("The operation cannot be performed.")
     # Calculate a determinant
     elif choice == "5":
         matrix_1 = input_matrix()
@@ -236,6 +231,63 @@ def menu() -> None:
         matrix_inverse(matrix_1)
 
 
-# Main program
-while True:
-    menu()
+def run_pipeline(matrix: Matrix, operations: list):
+    """
+    Applies operations to the matrix one after another. Operations build
+    a lazy expression, which is evaluated once with fused steps
+
+    :param matrix: Initial matrix
+    :param operations: List of "name[:argument]" strings:
+        add:FILE, mul:FILE, scale:CONST, transpose:TYPE, inverse, det
+    :return: Resulting matrix, or determinant if the last operation is det
+    """
+    expr = lazy(matrix)
+    for idx, operation in enumerate(operations):
+        name, _, argument = operation.partition(":")
+        if name == "add":
+            expr = expr + lazy(optimal(matrix_io.load(argument)))
+        elif name == "mul":
+            expr = expr @ lazy(optimal(matrix_io.load(argument)))
+        elif name == "scale":
+            expr = expr * float(argument)
+        elif name == "transpose" and (argument or "1") in TRANSPOSE_TYPES:
+            expr = expr.transpose(argument or "1")
+        elif name == "inverse":
+            expr = expr.inverse()
+        elif name == "det" and idx == len(operations) - 1:
+            return determinant(expr.evaluate())
+        else:
+            raise ValueError(f"Unknown operation: {operation}")
+    return expr.evaluate()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Numeric matrix processor")
+    parser.add_argument("input", nargs="?", help="Matrix file (.npy or text)")
+    parser.add_argument(
+        "--op",
+        action="append",
+        default=[],
+        help="Operation: add:FILE, mul:FILE, scale:CONST, transpose:TYPE, inverse, det",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        default="-",
+        help="Result file (.npy, .bin or text), - for stdout",
+    )
+    args = parser.parse_args()
+    if args.input is None:
+        while True:
+            menu()
+    try:
+        result = run_pipeline(optimal(matrix_io.load(args.input)), args.op)
+        if isinstance(result, (Matrix, SparseMatrix)):
+            matrix_io.save(to_dense(result), args.output)
+        else:
+            print(result)
+    except OSError as error:
+        print(error)
+        sys.exit(1)
+    except ValueError as error:
+        parser.error(str(error))
@@ -0,0 +1,304 @@
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Iterable, Iterator
+
+from matrix import Matrix
+
+# Matrices with smaller share of non-zero elements are stored as sparse
+SPARSE_DENSITY = 0.1
+
+
+class SparseMatrix:
+    """
+    Matrix in CSR format: column indexes and values of non-zero elements of
+    row i are indices[indptr[i]:indptr[i + 1]] and data[indptr[i]:indptr[i + 1]]
+    """
+
+    def __init__(
+        self, rows: int, cols: int, indptr: array, indices: array, data: array
+    ):
+        self.rows = rows
+        self.cols = cols
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+
+    @classmethod
+    def from_coo(cls, rows: int, cols: int, entries: Iterable[tuple]) -> "SparseMatrix":
+        """
+        Creates matrix from COO entries, duplicated entries are summed up
+
+        :param rows:
+        :param cols:
+        :param entries: (i, j, value) triples in any order
+        :return: New matrix
+        """
+        merged = defaultdict(float)
+        for i, j, value in entries:
+            merged[i, j] += value
+        indptr = array("q", bytes(8 * (rows + 1)))
+        indices = array("q")
+        values = array("d")
+        for (i, j), value in sorted(merged.items()):
+            if value:
+                indptr[i + 1] += 1
+                indices.append(j)
+                values.append(value)
+        for i in range(rows):
+            indptr[i + 1] += indptr[i]
+        return cls(rows, cols, indptr, indices, values)
+
+    @classmethod
+    def from_dense(cls, matrix: Matrix) -> "SparseMatrix":
+        """
+        :param matrix: Dense matrix
+        :return: Sparse copy of the matrix
+        """
+        indptr = array("q", [0])
+        indices = array("q")
+        values = array("d")
+        for row in matrix:
+            for j, value in enumerate(row):
+                if value:
+                    indices.append(j)
+                    values.append(value)
+            indptr.append(len(indices))
+        return cls(matrix.rows, matrix.cols, indptr, indices, values)
+
+    @property
+    def shape(self) -> tuple:
+        return self.rows, self.cols
+
+    @property
+    def nnz(self) -> int:
+        """
+        Number of stored non-zero elements
+        """
+        return len(self.data)
+
+    def row_items(self, i: int) -> Iterator[tuple]:
+        """
+        Iterates over non-zero elements of the row
+
+        :param i: Row index
+        :return: Iterator of (column index, value) pairs
+        """
+        start, end = self.indptr[i], self.indptr[i + 1]
+        return zip(self.indices[start:end], self.data[start:end])
+
+    def entries(self) -> Iterator[tuple]:
+        """
+        Iterates over non-zero elements in row-major order
+
+        :return: Iterator of (i, j, value) triples
+        """
+        for i in range(self.rows):
+            for j, value in self.row_items(i):
+                yield i, j, value
+
+    def __getitem__(self, idx: tuple) -> float:
+        i, j = idx
+        start, end = self.indptr[i], self.indptr[i + 1]
+        pos = bisect_left(self.indices, j, start, end)
+        if pos < end and self.indices[pos] == j:
+            return self.data[pos]
+        return 0.0
+
+    def row(self, i: int) -> array:
+        """
+        :param i: Row index
+        :return: Dense copy of the row
+        """
+        row = array("d", bytes(8 * self.cols))
+        for j, value in self.row_items(i):
+            row[j] = value
+        return row
+
+    def __iter__(self) -> Iterator[array]:
+        for i in range(self.rows):
+            yield self.row(i)
+
+    def values(self) -> Iterator[float]:
+        """
+        Iterates over all elements including zeros in row-major order
+        """
+        return (value for row in self for value in row)
+
+    def tolist(self) -> list:
+        """
+        :return: Dense matrix as list of rows
+        """
+        return [row.tolist() for row in self]
+
+    def to_dense(self) -> Matrix:
+        """
+        :return: Dense copy of the matrix
+        """
+        matrix = Matrix(self.rows, self.cols)
+        for i, j, value in self.entries():
+            matrix.data[i * self.cols + j] = value
+        return matrix
+
+    def transpose(self, trans_type: str = "1") -> "SparseMatrix":
+        """
+        Transposes matrix by specified way
+
+        :param trans_type: Kind of transposing, one of TRANSPOSE_TYPES
+        :return: Transposed matrix
+        """
+        last_row, last_col = self.rows - 1, self.cols - 1
+        # Main diagonal
+        if trans_type == "1":
+            entries = ((j, i, value) for i, j, value in self.entries())
+            return SparseMatrix.from_coo(self.cols, self.rows, entries)
+        # Side diagonal
+        if trans_type == "2":
+            entries = (
+                (last_col - j, last_row - i, value) for i, j, value in self.entries()
+            )
+            return SparseMatrix.from_coo(self.cols, self.rows, entries)
+        # Vertical line
+        if trans_type == "3":
+            entries = ((i, last_col - j, value) for i, j, value in self.entries())
+            return SparseMatrix.from_coo(self.rows, self.cols, entries)
+        # Horizontal line
+        if trans_type == "4":
+            entries = ((last_row - i, j, value) for i, j, value in self.entries())
+            return SparseMatrix.from_coo(self.rows, self.cols, entries)
+        raise ValueError(f"Unknown transpose type: {trans_type}")
+
+    def add(self, other: "SparseMatrix") -> "SparseMatrix":
+        """
+        :param other: Matrix of the same size
+        :return: Sum of matrices
+        """
+        if self.shape != other.shape:
+            raise ValueError("Matrix sizes don't match")
+        return SparseMatrix.from_coo(
+            self.rows, self.cols, list(self.entries()) + list(other.entries())
+        )
+
+    def scale(self, const: float) -> "SparseMatrix":
+        """
+        :param const:
+        :return: Matrix multiplied by a constant
+        """
+        if not const:
+            return SparseMatrix.from_coo(self.rows, self.cols, [])
+        data = array("d", [const * value for value in self.data])
+        indptr = array("q", self.indptr)
+        indices = array("q", self.indices)
+        return SparseMatrix(self.rows, self.cols, indptr, indices, data)
+
+    def multiply(self, other: "SparseMatrix") -> "SparseMatrix":
+        """
+        Multiplies matrices row by row, only non-zero elements are touched
+
+        :param other:
+        :return: self * other
+        """
+        if self.cols != other.rows:
+            raise ValueError("Matrix sizes don't match")
+        indptr = array("q", [0])
+        indices = array("q")
+        values = array("d")
+        for i in range(self.rows):
+            row = defaultdict(float)
+            for k, value in self.row_items(i):
+                for j, other_value in other.row_items(k):
+                    row[j] += value * other_value
+            for j in sorted(row):
+                if row[j]:
+                    indices.append(j)
+                    values.append(row[j])
+            indptr.append(len(indices))
+        return SparseMatrix(self.rows, other.cols, indptr, indices, values)
+
+    def determinant(self) -> float:
+        """
+        Calculates determinant by sparse LU decomposition with partial
+        pivoting, rows are dicts of non-zero elements, so elimination
+        touches only non-zero elements and their fill-in
+
+        :return: Determinant
+        """
+        if self.rows != self.cols:
+            raise ValueError("Matrix is not square")
+        rows = [dict(self.row_items(i)) for i in range(self.rows)]
+        # Column index -> indexes of not eliminated rows with non-zero in it
+        col_rows = defaultdict(set)
+        for i, row in enumerate(rows):
+            for j in row:
+                col_rows[j].add(i)
+        pivots = []
+        result = 1.0
+        for k in range(self.rows):
+            candidates = col_rows.pop(k, None)
+            if not candidates:
+                return 0.0
+            pivot = max(candidates, key=lambda i: abs(rows[i][k]))
+            candidates.discard(pivot)
+            pivot_row = rows[pivot]
+            for j in pivot_row:
+                if j != k:
+                    col_rows[j].discard(pivot)
+            pivot_value = pivot_row.pop(k)
+            for i in candidates:
+                row = rows[i]
+                factor = row.pop(k) / pivot_value
+                for j, value in pivot_row.items():
+                    new_value = row.get(j, 0.0) - factor * value
+                    if new_value:
+                        row[j] = new_value
+                        col_rows[j].add(i)
+                    elif j in row:
+                        del row[j]
+                        col_rows[j].discard(i)
+            pivots.append(pivot)
+            result *= pivot_value
+        # Every cycle of length n in rows permutation takes n - 1 swaps
+        seen = set()
+        for start in range(len(pivots)):
+            cur = start
+            length = 0
+            while cur not in seen:
+                seen.add(cur)
+                cur = pivots[cur]
+                length += 1
+            if length % 2 == 0 and length:
+                result = -result
+        return result
+
+
+def density(matrix) -> float:
+    """
+    :param matrix: Dense or sparse matrix
+    :return: Share of non-zero elements
+    """
+    if not matrix.rows or not matrix.cols:
+        return 1.0
+    if isinstance(matrix, SparseMatrix):
+        return matrix.nnz / (matrix.rows * matrix.cols)
+    return sum(1 for value in matrix.values() if value) / (matrix.rows * matrix.cols)
+
+
+def optimal(matrix):
+    """
+    Chooses storage by the share of non-zero elements
+
+    :param matrix: Dense or sparse matrix
+    :return: SparseMatrix if density is below SPARSE_DENSITY, Matrix otherwise
+    """
+    is_sparse = isinstance(matrix, SparseMatrix)
+    if density(matrix) < SPARSE_DENSITY:
+        return matrix if is_sparse else SparseMatrix.from_dense(matrix)
+    return matrix.to_dense() if is_sparse else matrix
+
+
+def to_dense(matrix) -> Matrix:
+    """
+    :param matrix: Dense or sparse matrix
+    :return: Dense matrix
+    """
+    return matrix.to_dense() if isinstance(matrix, SparseMatrix) else matrix
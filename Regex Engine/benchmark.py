@@ -0,0 +1,176 @@
+import argparse
+from random import Random
+import re
+import sys
+from time import perf_counter
+import tracemalloc
+
+import regex
+
+# Input sizes in bytes, from 10 B to 10 MB
+SIZES = [10, 1_000, 100_000, 10_000_000]
+# Minimal measuring time for one case, seconds
+MIN_TIME = 0.2
+# Filler words never contain a match, so every case scans the whole input
+WORDS = ["warning", "info", "disk", "space", "low", "3+3", "col"]
+# Python re backtracks exponentially on nested cases, check only short inputs
+BACKTRACKING_CHECK_SIZE = 16
+
+# (name, pattern, filler words or character, input tail, backtracks in re)
+CASES = [
+    ("literal", "disk full", WORDS, " disk full", False),
+    ("literal miss", "segfault", WORDS, "", False),
+    (".* chain", "d.*k.*q", WORDS, " q", False),
+    (".* chain miss", "w.*z", WORDS, "", False),
+    ("optional", "colou?r", WORDS, " colour", False),
+    ("plus", "lo+w!", WORDS, " loow!", False),
+    ("nested ?", "a?" * 12 + "a" * 12 + "b", "a", "b", True),
+    ("nested +", "a+" * 8 + "b", "a", "", True),
+    ("start anchor", "^warning", WORDS, "", False),
+    ("end anchor", "space low$", WORDS, " space low", False),
+    ("escapes", "3\\+3=6", WORDS, " 3+3=6", False),
+    ("escaped dot end", "\\.$", WORDS, ".", False),
+]
+
+
+def make_input(filler, size: int, tail: str, seed: int = 0) -> str:
+    """
+    Generates input string of the given size
+
+    :param filler: Words joined by spaces, or a single character to repeat
+    :param size: Length of the result
+    :param tail: String to put at the end of the input
+    :param seed: Random seed
+    :return: Input string
+    """
+    size = max(size - len(tail), 0)
+    if isinstance(filler, str):
+        return filler * size + tail
+    rnd = Random(seed)
+    words = []
+    length = 0
+    while length < size:
+        words.append(rnd.choice(filler))
+        length += len(words[-1]) + 1
+    return " ".join(words)[:size] + tail
+
+
+def to_python_re(pattern: str) -> str:
+    """
+    Translates the pattern to the equivalent Python re pattern
+
+    :param pattern: Regular expression supported by the engine
+    :return: Python re pattern
+    """
+    anchored_start, anchored_end, items = regex.parse_pattern(pattern)
+    result = "^" if anchored_start else ""
+    for atom, quantifier in items:
+        result += ("." if atom is None else re.escape(atom)) + quantifier
+    return result + ("$" if anchored_end else "")
+
+
+def max_call_depth(func, *args) -> int:
+    """
+    Measures the deepest Python call stack reached by func
+
+    :param func: Function to call
+    :return: Maximal depth relative to func
+    """
+    depth = 0
+    max_depth = 0
+
+    def profiler(frame, event, arg):
+        nonlocal depth, max_depth
+        if event == "call":
+            depth += 1
+            max_depth = max(max_depth, depth)
+        elif event == "return":
+            depth -= 1
+
+    sys.setprofile(profiler)
+    try:
+        func(*args)
+    finally:
+        sys.setprofile(None)
+    return max_depth
+
+
+def measure(pattern: str, text: str, dfa: bool) -> dict:
+    """
+    Measures matching of the pattern against text
+
+    :param pattern: Regular expression
+    :param text: Input string
+    :param dfa: Match with a lazily built DFA
+    :return: Dict of result, throughput, peak memory and call depth
+    """
+    program = regex.Program(pattern, dfa)
+    runs = 0
+    start = perf_counter()
+    while True:
+        result = program.search(text)
+        runs += 1
+        elapsed = perf_counter() - start
+        if elapsed >= MIN_TIME:
+            break
+    tracemalloc.start()
+    regex.Program(pattern, dfa).search(text)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # Profiling is slow, call depth doesn't depend on the input length
+    depth = max_call_depth(regex.Program(pattern, dfa).search, text[:1000])
+    return {
+        "result": result,
+        "mb_per_sec": len(text) * runs / elapsed / 1e6,
+        "peak_kb": peak / 1024,
+        "depth": depth,
+    }
+
+
+def run(sizes: list, modes: list) -> bool:
+    """
+    Runs all cases and prints results table
+
+    :param sizes: Input sizes
+    :param modes: Matching modes ("nfa", "dfa")
+    :return: True if all checked results are equal to Python re results
+    """
+    all_correct = True
+    print(
+        f"{'case':<16}{'size':>10}{'mode':>6}{'MB/s':>10}"
+        f"{'peak KiB':>10}{'depth':>7}  check"
+    )
+    for name, pattern, filler, tail, backtracking in CASES:
+        python_re = re.compile(to_python_re(pattern), re.S)
+        for size in sizes:
+            text = make_input(filler, size, tail)
+            expected = None
+            if not backtracking or size <= BACKTRACKING_CHECK_SIZE:
+                expected = python_re.search(text) is not None
+            for mode in modes:
+                stats = measure(pattern, text, mode == "dfa")
+                if expected is None:
+                    check = "skipped"
+                elif stats["result"] == expected:
+                    check = "ok"
+                else:
+                    check = "FAILED"
+                    all_correct = False
+                print(
+                    f"{name:<16}{size:>10}{mode:>6}{stats['mb_per_sec']:>10.2f}"
+                    f"{stats['peak_kb']:>10.1f}{stats['depth']:>7}  {check}"
+                )
+    return all_correct
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Regex engine benchmark")
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=SIZES, help="Input sizes in bytes"
+    )
+    parser.add_argument(
+        "--modes", nargs="+", default=["nfa", "dfa"], choices=["nfa", "dfa"]
+    )
+    args = parser.parse_args()
+    if not run(args.sizes, args.modes):
+        sys.exit(1)
@@ -1,66 +1,654 @@
-def rec_match(pattern: str, input_string: str) -> bool:
-    """
-    Recursive function to find the matching pattern
-    """
-    # Pattern is over
-    if not pattern:
-        return True
-    # Input string is over
-    if not input_string:
-        return pattern == "$"
-    # Escape character processing
-    if pattern[0] == "\\":
-        if pattern[1] == input_string[0]:
-            return rec_match(pattern[2:], input_string[1:])
-        return False
-    # ? meta character
-    if pattern.find("?") == 1:
-        if pattern[0] == input_string[0] or pattern[0] == ".":
-            return rec_match(pattern[2:], input_string[1:])
-        else:
-            return rec_match(pattern[2:], input_string)
-    # * meta character
-    if pattern.find("*") == 1:
-        if pattern[0] == input_string[0]:
-            return rec_match(pattern, input_string[1:])
-        elif pattern[0] == ".":
-            shift = input_string.count(input_string[0])
-            return rec_match(pattern[2:], input_string[shift:])
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import repeat
+import mmap
+import sys
+from typing import Iterable, Iterator
+
+# Program instructions: (opcode, x, y)
+CHAR, ANY, SPLIT, JMP, MATCH = range(5)
+QUANTIFIERS = "?*+"
+# Number of compiled patterns kept by compile()
+CACHE_SIZE = 256
+# Number of lazily built DFA states per pattern before falling back to NFA
+MAX_DFA_STATES = 1024
+# Size of file chunks scanned by worker processes in parallel mode
+CHUNK_SIZE = 4 * 1024 * 1024
+
+
+def parse_pattern(pattern: str) -> tuple:
+    """
+    Splits pattern into anchors and a list of atoms with their quantifiers
+
+    :param pattern: Regular expression
+    :return: (anchored_start, anchored_end, [(atom, quantifier), ...]),
+        atom is a character or None for "." wildcard,
+        quantifier is one of "", "?", "*", "+"
+    """
+    anchored_start = pattern.startswith("^")
+    if anchored_start:
+        pattern = pattern[1:]
+    anchored_end = False
+    items = []
+    idx = 0
+    while idx < len(pattern):
+        char = pattern[idx]
+        idx += 1
+        # Escape character processing
+        if char == "\\":
+            if idx == len(pattern):
+                raise ValueError("Pattern ends with an escape character")
+            atom = pattern[idx]
+            idx += 1
+        # $ is an anchor only at the end of the pattern
+        elif char == "$" and idx == len(pattern):
+            anchored_end = True
+            break
+        elif char == ".":
+            atom = None
+        # Quantifier without an atom is a regular character
+        elif char in QUANTIFIERS:
+            items.append((char, ""))
+            continue
         else:
-            return rec_match(pattern[2:], input_string)
-    # + meta character
-    if pattern.find("+") == 1:
-        if pattern[0] == input_string[0]:
-            return rec_match(pattern.replace("+", "*", 1), input_string[1:])
-        elif pattern[0] == ".":
-            shift = input_string.count(input_string[0])
-            return rec_match(pattern[2:], input_string[shift:])
+            atom = char
+        quantifier = ""
+        if idx < len(pattern) and pattern[idx] in QUANTIFIERS:
+            quantifier = pattern[idx]
+            idx += 1
+        items.append((atom, quantifier))
+    return anchored_start, anchored_end, items
+
+
+def build_program(items: list) -> list:
+    """
+    Translates atoms into Thompson NFA instructions
+
+    :param items: [(atom, quantifier), ...] from parse_pattern
+    :return: List of (opcode, x, y) instructions, the last one is MATCH
+    """
+    program = []
+    for atom, quantifier in items:
+        consume = (ANY, None, None) if atom is None else (CHAR, atom, None)
+        start = len(program)
+        if quantifier == "?":
+            program.append((SPLIT, start + 1, start + 2))
+            program.append(consume)
+        elif quantifier == "*":
+            program.append((SPLIT, start + 1, start + 3))
+            program.append(consume)
+            program.append((JMP, start, None))
+        elif quantifier == "+":
+            program.append(consume)
+            program.append((SPLIT, start, start + 2))
         else:
-            return rec_match(pattern[0] + pattern[2:], input_string)
-    # regular characters
-    if pattern[0] == input_string[0] or pattern[0] == ".":
-        return rec_match(pattern[1:], input_string[1:])
-    return False
-
-
-def search(pattern: str, input_string: str) -> bool:
-    """
-    Searching for a pattern in the input_string and call recursive function when needed
-    """
-    # No pattern to match
-    if not pattern:
-        return True
-    # Match at the beginning
-    if pattern.startswith("^"):
-        return rec_match(pattern[1:], input_string)
-    # Search in longer input_string
-    for shift in range(len(input_str)):
-        if rec_match(pattern, input_string[shift:]):
-            return True
-    # Nothing matched
-    return False
-
-
-# Main
-regex, input_str = input().split("|")
-print(search(regex, input_str))
+            program.append(consume)
+    program.append((MATCH, None, None))
+    return program
+
+
+def required_literals(items: list) -> tuple:
+    """
+    Finds literals which every match has to contain
+
+    :param items: [(atom, quantifier), ...] from parse_pattern
+    :return: (prefix, required) - literal every match starts with and
+        the longest literal every match contains
+    """
+    runs = [""]
+    for atom, quantifier in items:
+        # Atom with + is mandatory once, but the run is broken by repetitions
+        if atom is not None and quantifier in ("", "+"):
+            runs[-1] += atom
+        if atom is None or quantifier:
+            runs.append("")
+    return runs[0], max(runs, key=len)
+
+
+def epsilon_closures(program: list) -> list:
+    """
+    Finds consuming and MATCH instructions reachable from every instruction
+    without consuming input, in priority order
+
+    :param program: NFA instructions
+    :return: List of pc lists, one per instruction
+    """
+    closures = []
+    for pc in range(len(program)):
+        closure = []
+        seen = set()
+        stack = [pc]
+        while stack:
+            cur = stack.pop()
+            if cur in seen:
+                continue
+            seen.add(cur)
+            op, x, y = program[cur]
+            if op == SPLIT:
+                stack.append(y)
+                stack.append(x)
+            elif op == JMP:
+                stack.append(x)
+            else:
+                closure.append(cur)
+        closures.append(closure)
+    return closures
+
+
+class Program:
+    def __init__(self, pattern: str, dfa: bool = False):
+        self.pattern = pattern
+        self.anchored_start, self.anchored_end, items = parse_pattern(pattern)
+        self.instructions = build_program(items)
+        self.closures = epsilon_closures(self.instructions)
+        self.start = frozenset(self.closures[0])
+        self.match_pc = len(self.instructions) - 1
+        self.prefix, self.required = required_literals(items)
+        # Unanchored search may skip straight to the next prefix occurrence
+        self.skip_prefix = "" if self.anchored_start else self.prefix
+        self.dfa = dfa
+        # Lazily built DFA: state id -> set of NFA pcs, verdict and transitions
+        self.dfa_ids = {}
+        self.dfa_sets = []
+        self.dfa_verdicts = []
+        self.dfa_transitions = []
+        self.add_dfa_state(self.start)
+
+    def step(self, states: set, char: str) -> set:
+        """
+        Advances every NFA thread by one input character, unanchored search
+        also starts a new thread at the next position
+
+        :param states: Current set of consuming pcs
+        :param char: Input character
+        :return: Next set of pcs
+        """
+        instructions = self.instructions
+        closures = self.closures
+        next_states = set()
+        for pc in states:
+            op, x, _ = instructions[pc]
+            if op == ANY or (op == CHAR and x == char):
+                next_states.update(closures[pc + 1])
+        if not self.anchored_start:
+            next_states.update(closures[0])
+        return next_states
+
+    def simulate(self, states: set, input_string: str, pos: int = 0) -> bool:
+        """
+        Simulates the NFA over input_string with a single left-to-right pass
+
+        :param states: Set of pcs before reading input_string[pos]
+        :param input_string: String to search in
+        :param pos: Position to continue from
+        :return: True if the pattern matches
+        """
+        match_pc = self.match_pc
+        prefix = self.skip_prefix
+        while pos < len(input_string):
+            # No thread is in progress, jump to the next possible match start
+            if prefix and states == self.start:
+                pos = input_string.find(prefix, pos)
+                if pos < 0:
+                    return False
+            if match_pc in states and not self.anchored_end:
+                return True
+            if not states:
+                return False
+            states = self.step(states, input_string[pos])
+            pos += 1
+        return match_pc in states
+
+    def add_dfa_state(self, states: frozenset) -> int:
+        """
+        Registers a DFA state for the set of NFA pcs
+
+        :param states: Set of pcs
+        :return: DFA state id or None if MAX_DFA_STATES is exceeded
+        """
+        if states in self.dfa_ids:
+            return self.dfa_ids[states]
+        if len(self.dfa_sets) >= MAX_DFA_STATES:
+            return None
+        # True - match is found, False - no match possible, None - go on
+        verdict = None
+        if self.match_pc in states and not self.anchored_end:
+            verdict = True
+        elif not states:
+            verdict = False
+        self.dfa_ids[states] = len(self.dfa_sets)
+        self.dfa_sets.append(states)
+        self.dfa_verdicts.append(verdict)
+        self.dfa_transitions.append({})
+        return self.dfa_ids[states]
+
+    def search_dfa(self, input_string: str) -> bool:
+        """
+        Runs the lazily built DFA over input_string, falls back to NFA
+        simulation when the DFA state budget is exhausted
+
+        :param input_string: String to search in
+        :return: True if the pattern matches
+        """
+        verdicts = self.dfa_verdicts
+        transitions = self.dfa_transitions
+        prefix = self.skip_prefix
+        state = 0
+        pos = 0
+        while pos < len(input_string):
+            # No thread is in progress, jump to the next possible match start
+            if prefix and state == 0:
+                pos = input_string.find(prefix, pos)
+                if pos < 0:
+                    return False
+            if verdicts[state] is not None:
+                return verdicts[state]
+            char = input_string[pos]
+            next_state = transitions[state].get(char)
+            if next_state is None:
+                states = self.dfa_sets[state]
+                next_state = self.add_dfa_state(frozenset(self.step(states, char)))
+                if next_state is None:
+                    return self.simulate(set(states), input_string, pos)
+                transitions[state][char] = next_state
+            state = next_state
+            pos += 1
+        return self.match_pc in self.dfa_sets[state]
+
+    def search(self, input_string: str) -> bool:
+        """
+        Searches for the pattern in input_string
+
+        :param input_string: String to search in
+        :return: True if the pattern matches anywhere in input_string
+        """
+        # Prefilter lines which can't contain a match
+        if self.required not in input_string:
+            return False
+        if self.anchored_start and not input_string.startswith(self.prefix):
+            return False
+        if self.dfa:
+            return self.search_dfa(input_string)
+        return self.simulate(set(self.start), input_string)
+
+    def match_span(self, input_string: str, pos: int = 0) -> tuple:
+        """
+        Finds the leftmost match starting at pos or later, preferring greedy
+        repetitions like Python re does. Threads are kept in priority order
+        together with their start positions
+
+        :param input_string: String to search in
+        :param pos: Position to start searching from
+        :return: (start, end) span or None if nothing matched
+        """
+        instructions = self.instructions
+        closures = self.closures
+        prefix = self.skip_prefix
+        threads = []  # [(pc, start), ...]
+        seen = set()
+        span = None
+        while True:
+            # Until something matched, start a new thread at every position
+            if span is None and (pos == 0 or not self.anchored_start):
+                if prefix and not threads:
+                    pos = input_string.find(prefix, pos)
+                    if pos < 0:
+                        return None
+                for pc in self.closures[0]:
+                    if pc not in seen:
+                        threads.append((pc, pos))
+            if not threads:
+                return span
+            char = input_string[pos] if pos < len(input_string) else None
+            next_threads = []
+            seen = set()
+            for pc, start in threads:
+                op, x, _ = instructions[pc]
+                if op == MATCH:
+                    if char is None or not self.anchored_end:
+                        # Lower priority threads can't win anymore
+                        span = (start, pos)
+                        break
+                elif char is not None and (op == ANY or (op == CHAR and x == char)):
+                    for next_pc in closures[pc + 1]:
+                        if next_pc not in seen:
+                            seen.add(next_pc)
+                            next_threads.append((next_pc, start))
+            if char is None:
+                return span
+            threads = next_threads
+            pos += 1
+
+    def finditer(self, input_string: str) -> Iterator[tuple]:
+        """
+        Finds all non-overlapping matches from left to right
+
+        :param input_string: String to search in
+        :return: Generator of (start, end) spans
+        """
+        if self.required not in input_string:
+            return
+        pos = 0
+        while pos <= len(input_string):
+            span = self.match_span(input_string, pos)
+            if span is None:
+                return
+            yield span
+            start, pos = span
+            # Step over empty match to avoid finding it again
+            if start == pos:
+                pos += 1
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def compile(pattern: str, dfa: bool = False) -> Program:
+    """
+    Compiles pattern into a reusable NFA program. Least recently used
+    programs are evicted, hits and misses are reported by compile.cache_info()
+
+    :param pattern: Regular expression
+    :param dfa: Match with a lazily built DFA
+    :return: Compiled program
+    """
+    return Program(pattern, dfa)
+
+
+def search(pattern: str, input_string: str, dfa: bool = False) -> bool:
+    """
+    Searching for a pattern in the input_string
+    """
+    return compile(pattern, dfa).search(input_string)
+
+
+def finditer(pattern: str, input_string: str) -> Iterator[tuple]:
+    """
+    Finds spans of all non-overlapping matches of the pattern
+
+    :param pattern: Regular expression
+    :param input_string: String to search in
+    :return: Generator of (start, end) spans
+    """
+    return compile(pattern).finditer(input_string)
+
+
+class PatternSet:
+    def __init__(self, patterns: Iterable[str]):
+        self.patterns = list(patterns)
+        # Programs of all patterns are merged into one NFA with shifted pcs
+        self.instructions = []
+        self.closures = []
+        self.match_indexes = {}  # match pc -> pattern index
+        self.anchored_end = []
+        initial = set()
+        restart = set()
+        for index, pattern in enumerate(self.patterns):
+            program = compile(pattern)
+            offset = len(self.instructions)
+            self.instructions.extend(program.instructions)
+            self.closures.extend(
+                [pc + offset for pc in closure] for closure in program.closures
+            )
+            self.match_indexes[program.match_pc + offset] = index
+            self.anchored_end.append(program.anchored_end)
+            initial.update(self.closures[offset])
+            if not program.anchored_start:
+                restart.update(self.closures[offset])
+        self.restart = frozenset(restart)
+        # Lazily built DFA: state id -> set of NFA pcs, matches and transitions
+        self.dfa_ids = {}
+        self.dfa_sets = []
+        self.dfa_matches = []
+        self.dfa_final_matches = []
+        self.dfa_transitions = []
+        self.add_dfa_state(frozenset(initial))
+
+    def step(self, states: set, char: str) -> set:
+        """
+        Advances threads of all patterns by one input character
+
+        :param states: Current set of consuming pcs
+        :param char: Input character
+        :return: Next set of pcs
+        """
+        instructions = self.instructions
+        closures = self.closures
+        next_states = set(self.restart)
+        for pc in states:
+            op, x, _ = instructions[pc]
+            if op == ANY or (op == CHAR and x == char):
+                next_states.update(closures[pc + 1])
+        return next_states
+
+    def matches(self, states: set, at_end: bool) -> set:
+        """
+        Collects indexes of patterns matched in the set of NFA pcs
+
+        :param states: Set of pcs
+        :param at_end: The whole input is consumed, patterns ending with $ match
+        :return: Set of pattern indexes
+        """
+        matched = set()
+        for pc in states:
+            index = self.match_indexes.get(pc)
+            if index is not None and (at_end or not self.anchored_end[index]):
+                matched.add(index)
+        return matched
+
+    def add_dfa_state(self, states: frozenset) -> int:
+        """
+        Registers a DFA state for the set of NFA pcs
+
+        :param states: Set of pcs
+        :return: DFA state id or None if MAX_DFA_STATES is exceeded
+        """
+        if states in self.dfa_ids:
+            return self.dfa_ids[states]
+        if len(self.dfa_sets) >= MAX_DFA_STATES:
+            return None
+        self.dfa_ids[states] = len(self.dfa_sets)
+        self.dfa_sets.append(states)
+        self.dfa_matches.append(self.matches(states, False))
+        self.dfa_final_matches.append(self.matches(states, True))
+        self.dfa_transitions.append({})
+        return self.dfa_ids[states]
+
+    def search(self, input_string: str) -> list:
+        """
+        Finds all patterns matching input_string in a single pass
+
+        :param input_string: String to search in
+        :return: Sorted indexes of matched patterns
+        """
+        dfa_matches = self.dfa_matches
+        transitions = self.dfa_transitions
+        matched = set()
+        state = 0
+        for pos, char in enumerate(input_string):
+            if dfa_matches[state]:
+                matched.update(dfa_matches[state])
+            next_state = transitions[state].get(char)
+            if next_state is None:
+                states = self.dfa_sets[state]
+                next_state = self.add_dfa_state(frozenset(self.step(states, char)))
+                # DFA state budget is exhausted, continue with NFA simulation
+                if next_state is None:
+                    states = set(states)
+                    for char_ in input_string[pos:]:
+                        matched.update(self.matches(states, False))
+                        states = self.step(states, char_)
+                    matched.update(self.matches(states, True))
+                    return sorted(matched)
+                transitions[state][char] = next_state
+            state = next_state
+        matched.update(self.dfa_final_matches[state])
+        return sorted(matched)
+
+
+def grep(pattern: str, lines: Iterable[str], dfa: bool = False) -> Iterator[tuple]:
+    """
+    Lazily filters lines matching the pattern, compiling it only once
+
+    :param pattern: Regular expression
+    :param lines: Any iterable of lines, e.g. an opened file or sys.stdin
+    :param dfa: Match with a lazily built DFA
+    :return: Generator of (line_number, line) pairs, line without newline
+    """
+    program = compile(pattern, dfa)
+    for line_number, line in enumerate(lines, 1):
+        line = line.rstrip("\r\n")
+        if program.search(line):
+            yield line_number, line
+
+
+def read_lines(file_name: str) -> Iterator[str]:
+    """
+    Lazily reads the text file line by line. Lines end only with "\n",
+    as in parallel mode, a lone "\r" doesn't split a line
+
+    :param file_name: File to read
+    :return: Generator of lines
+    """
+    with open(file_name, "r", encoding="utf-8", newline="\n") as text_file:
+        yield from text_file
+
+
+def file_chunks(file_name: str, chunk_size: int = CHUNK_SIZE) -> list:
+    """
+    Splits the file into chunks ending at line boundaries
+
+    :param file_name: File to split
+    :param chunk_size: Approximate chunk size in bytes
+    :return: List of (start, end) byte offsets
+    """
+    chunks = []
+    with open(file_name, "rb") as binary_file:
+        # Empty files can't be memory-mapped
+        if not binary_file.seek(0, 2):
+            return chunks
+        with mmap.mmap(binary_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            start = 0
+            while start < len(mapped):
+                newline = mapped.find(b"\n", start + chunk_size - 1)
+                end = len(mapped) if newline < 0 else newline + 1
+                chunks.append((start, end))
+                start = end
+    return chunks
+
+
+def scan_chunk(pattern: str, file_name: str, start: int, end: int, dfa: bool) -> tuple:
+    """
+    Matches lines of the file chunk, runs in a worker process
+
+    :param pattern: Regular expression
+    :param file_name: Scanned file
+    :param start: Chunk start offset
+    :param end: Chunk end offset
+    :param dfa: Match with a lazily built DFA
+    :return: (number of lines in the chunk, [(line_number, line), ...]),
+        line numbers are counted from the chunk start
+    """
+    with open(file_name, "rb") as binary_file:
+        with mmap.mmap(binary_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            lines = mapped[start:end].decode("utf-8").split("\n")
+    # Chunk ends with a newline
+    if not lines[-1]:
+        lines.pop()
+    return len(lines), list(grep(pattern, lines, dfa))
+
+
+def parallel_grep(
+    pattern: str,
+    file_name: str,
+    jobs: int = None,
+    dfa: bool = False,
+    chunk_size: int = CHUNK_SIZE,
+) -> Iterator[tuple]:
+    """
+    Scans memory-mapped file chunks in a process pool, results keep file order
+
+    :param pattern: Regular expression
+    :param file_name: File to scan
+    :param jobs: Number of worker processes, all CPU cores by default
+    :param dfa: Match with a lazily built DFA
+    :param chunk_size: Approximate chunk size in bytes
+    :return: Generator of (line_number, line) pairs, line without newline
+    """
+    chunks = file_chunks(file_name, chunk_size)
+    with ProcessPoolExecutor(jobs) as executor:
+        results = executor.map(
+            scan_chunk,
+            repeat(pattern),
+            repeat(file_name),
+            [start for start, _ in chunks],
+            [end for _, end in chunks],
+            repeat(dfa),
+        )
+        line_offset = 0
+        for lines_count, matches in results:
+            for line_number, line in matches:
+                yield line_offset + line_number, line
+            line_offset += lines_count
+
+
+def grep_file(
+    pattern: str,
+    file_name: str,
+    line_numbers: bool = False,
+    dfa: bool = False,
+    jobs: int = 0,
+    count: bool = False,
+) -> None:
+    """
+    Prints lines of the file (stdin for "-") matching the pattern
+
+    :param pattern: Regular expression
+    :param file_name: File to scan line by line
+    :param line_numbers: Prefix every line with its number
+    :param dfa: Match with a lazily built DFA
+    :param jobs: Scan the file in parallel by this number of processes
+    :param count: Print only the number of matched lines
+    """
+    if jobs:
+        matches = parallel_grep(pattern, file_name, jobs, dfa)
+    elif file_name == "-":
+        matches = grep(pattern, sys.stdin, dfa)
+    else:
+        matches = grep(pattern, read_lines(file_name), dfa)
+    total = 0
+    for line_number, line in matches:
+        total += 1
+        if not count:
+            print(f"{line_number}:{line}" if line_numbers else line)
+    if count:
+        print(total)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Regex engine")
+    parser.add_argument("pattern", nargs="?", help="Pattern to search line by line")
+    parser.add_argument(
+        "file", nargs="?", default="-", help="File to scan, - for stdin"
+    )
+    parser.add_argument(
+        "-n", "--line-number", action="store_true", help="Print line numbers"
+    )
+    parser.add_argument(
+        "--dfa", action="store_true", help="Match with a lazily built DFA"
+    )
+    parser.add_argument(
+        "-c", "--count", action="store_true", help="Print number of matched lines"
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=0, help="Number of processes to scan file"
+    )
+    args = parser.parse_args()
+    if args.jobs and args.file == "-":
+        parser.error("parallel mode needs a file")
+    if args.pattern is None:
+        regex, input_str = input().split("|")
+        print(search(regex, input_str, args.dfa))
+    else:
+        grep_file(
+            args.pattern, args.file, args.line_number, args.dfa, args.jobs, args.count
+        )
@@ -0,0 +1,484 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter, deque
+from itertools import chain, repeat
+import mmap
+from operator import add, sub
+import os
+import struct
+import sys
+from typing import Iterable, Iterator, Sequence, TextIO
+
+from nltk.tokenize import regexp_tokenize
+
+# First bytes of a saved model, the last one is format version
+MODEL_MAGIC = b"\x93MARKOV\x03"
+# Magic, order, length of vocabulary in bytes and number of sentence starts,
+# followed by numbers of nodes on every level of the trie
+HEADER = struct.Struct("<8sqqq")
+# Supported lengths of n-grams
+MIN_ORDER = 2
+MAX_ORDER = 6
+DEFAULT_ORDER = 3
+# Number of characters read from a text at once
+CHUNK_SIZE = 1 << 20
+END_MARKERS = (".", "!", "?")
+
+
+class Model:
+    """
+    Markov chain model of a text. Tokens are replaced by integer IDs and all
+    n-grams up to the model order are stored in a trie by levels: node i of
+    level d is a (d + 1)-gram ending with token ids[d][i], its children are
+    nodes children[d][i]:children[d][i + 1] of level d + 1 sorted by token,
+    so n-grams share their prefixes. Counts of siblings are stored as running
+    sums in weights[d], so a following word is chosen by binary search.
+    Contexts which can start a sentence are listed in starts as nodes of
+    level order - 2
+    """
+
+    def __init__(
+        self, tokens: list, ids: list, weights: list, children: list, starts: array
+    ):
+        self.tokens = tokens
+        self.ids = ids
+        self.weights = weights
+        self.children = children
+        self.starts = starts
+
+    @property
+    def order(self) -> int:
+        """
+        Length of the longest n-grams
+        """
+        return len(self.ids)
+
+    @classmethod
+    def build(cls, tokens: Iterable[str], order: int = DEFAULT_ORDER) -> "Model":
+        """
+        Counts n-grams of the text, see count_ngrams()
+
+        :param tokens: Words of the text, may be a lazy iterator
+        :param order: Length of the longest n-grams
+        :return: New model
+        """
+        if not MIN_ORDER <= order <= MAX_ORDER:
+            raise ValueError(f"Order must be from {MIN_ORDER} to {MAX_ORDER}")
+        vocabulary = {}
+        ngrams = count_ngrams(
+            (vocabulary.setdefault(token, len(vocabulary)) for token in tokens), order
+        )
+        return cls.from_counts(list(vocabulary), order, sorted(ngrams.items()))
+
+    @classmethod
+    def from_counts(cls, tokens: list, order: int, ngrams: Iterable[tuple]) -> "Model":
+        """
+        Builds the trie level by level. Sorted tuples go in preorder of the
+        trie (a prefix is less than its extensions), so siblings are appended
+        to their level one after another
+
+        :param tokens: Vocabulary
+        :param order: Length of the longest n-grams
+        :param ngrams: Sorted (n-gram, count) pairs including all prefixes
+        :return: New model
+        """
+        ids = [array("q") for _ in range(order)]
+        weights = [array("q") for _ in range(order)]
+        children = [array("q") for _ in range(order - 1)]
+        for ngram, count in ngrams:
+            level = len(ngram) - 1
+            # Index of the first child of the last node on the upper level
+            first_sibling = children[level - 1][-1] if level else 0
+            if len(ids[level]) > first_sibling:
+                count += weights[level][-1]
+            ids[level].append(ngram[-1])
+            weights[level].append(count)
+            if level < order - 1:
+                children[level].append(len(ids[level + 1]))
+        for level, pointers in enumerate(children):
+            pointers.append(len(ids[level + 1]))
+        return cls(tokens, ids, weights, children, find_starts(tokens, ids, children))
+
+    @classmethod
+    def load(cls, file_name: str) -> "Model":
+        """
+        Reads model saved by save(), arrays are mapped to memory, so loading
+        doesn't depend on the model size
+
+        :param file_name:
+        :return: Model
+        """
+        with open(file_name, "rb") as binary_file:
+            magic, order, vocabulary_size, starts_number = HEADER.unpack(
+                binary_file.read(HEADER.size)
+            )
+            if magic != MODEL_MAGIC:
+                raise ValueError(f"{file_name} is not a model file")
+            nodes = struct.unpack(f"<{order}q", binary_file.read(8 * order))
+            vocabulary = binary_file.read(vocabulary_size).decode("utf-8")
+            mapped = mmap.mmap(binary_file.fileno(), 0, access=mmap.ACCESS_READ)
+        # Arrays are aligned to 8 bytes after the vocabulary
+        offset = HEADER.size + 8 * order + vocabulary_size + -vocabulary_size % 8
+        sizes = [*nodes, *nodes, *(size + 1 for size in nodes[:-1]), starts_number]
+        arrays = []
+        for size in sizes:
+            data = memoryview(mapped)[offset : offset + 8 * size].cast("q")
+            if sys.byteorder != "little":
+                data = array("q", data)
+                data.byteswap()
+            arrays.append(data)
+            offset += 8 * size
+        tokens = vocabulary.split("\n") if vocabulary else []
+        ids, weights = arrays[:order], arrays[order : 2 * order]
+        return cls(tokens, ids, weights, arrays[2 * order : -1], arrays[-1])
+
+    def save(self, file_name: str) -> None:
+        """
+        Writes model to a binary file: header, vocabulary as lines and
+        arrays of 64-bit little-endian integers. The file is replaced at
+        once, so a model mapped from it can be saved back
+
+        :param file_name:
+        """
+        vocabulary = "\n".join(self.tokens).encode("utf-8")
+        temp_name = f"{file_name}.tmp"
+        with open(temp_name, "wb") as binary_file:
+            binary_file.write(
+                HEADER.pack(MODEL_MAGIC, self.order, len(vocabulary), len(self.starts))
+            )
+            binary_file.write(array("q", map(len, self.ids)))
+            binary_file.write(vocabulary + bytes(-len(vocabulary) % 8))
+            for data in [*self.ids, *self.weights, *self.children, self.starts]:
+                if sys.byteorder != "little":
+                    data = array("q", data)
+                    data.byteswap()
+                binary_file.write(data)
+        os.replace(temp_name, file_name)
+
+    def update(self, tokens: Iterable[str], subtract: bool = False) -> "Model":
+        """
+        Adds counts of n-grams of a document to the model, or subtracts counts
+        of a document added earlier. Only n-grams of the document are looked
+        up, nodes between them are copied by slices, so the work in Python
+        depends on the document size, not on the model size
+
+        :param tokens: Words of the document, may be a lazy iterator
+        :param subtract: Subtract counts instead of adding them
+        :return: Updated model
+        """
+        vocabulary = dict(zip(self.tokens, range(len(self.tokens))))
+        try:
+            changes = count_ngrams(
+                (
+                    vocabulary[token]
+                    if subtract
+                    else vocabulary.setdefault(token, len(vocabulary))
+                    for token in tokens
+                ),
+                self.order,
+            )
+        except KeyError as error:
+            raise ValueError(f"Token {error} is not in the model") from None
+        edits = self.find_edits(changes, -1 if subtract else 1)
+        # Number of added minus number of removed children of changed n-grams
+        added = Counter()
+        for level_edits in edits[1:]:
+            for ngram, _, exists, _, _, _, new_count in level_edits:
+                added[ngram[:-1]] += (new_count > 0) - exists
+        tokens = list(vocabulary)
+        starts = array("q")
+        levels = [
+            self.merge_level(level, level_edits, added, tokens, starts)
+            for level, level_edits in enumerate(edits)
+        ]
+        ids = [new[0] for new in levels]
+        weights = [new[1] for new in levels]
+        children = [new[2] for new in levels[:-1]]
+        return Model(tokens, ids, weights, children, starts)
+
+    def find_edits(self, changes: Counter, sign: int) -> list:
+        """
+        Finds places of changed n-grams in the trie. Parents are found before
+        children, as sorted n-grams go in preorder
+
+        :param changes: Counts of n-grams to change by
+        :param sign: 1 to add counts, -1 to subtract them
+        :return: Lists of edits by levels in order of nodes: (n-gram, node
+            index or insertion point, whether the node exists, running sum
+            of counts before it, end of its siblings, old count, new count)
+        """
+        edits = [[] for _ in range(self.order)]
+        places = {}
+        for ngram in sorted(changes):
+            level = len(ngram) - 1
+            level_ids, weights = self.ids[level], self.weights[level]
+            if not level:
+                lo, hi = 0, len(level_ids)
+            else:
+                parent, parent_exists = places[ngram[:-1]]
+                pointers = self.children[level - 1]
+                lo = pointers[parent]
+                hi = pointers[parent + 1] if parent_exists else lo
+            node = bisect_left(level_ids, ngram[-1], lo, hi)
+            exists = node < hi and level_ids[node] == ngram[-1]
+            places[ngram] = node, exists
+            before = weights[node - 1] if node > lo else 0
+            count = weights[node] - before if exists else 0
+            new_count = count + sign * changes[ngram]
+            if new_count < 0:
+                raise ValueError("Document was not added to the model")
+            edits[level].append((ngram, node, exists, before, hi, count, new_count))
+        return edits
+
+    def merge_level(
+        self, level: int, edits: list, added: Counter, tokens: list, starts: array
+    ) -> list:
+        """
+        Copies the trie level applying edits. Running sums of siblings after
+        a changed node and children pointers after a changed number of
+        children are shifted by a constant up to the next edit
+
+        :param level:
+        :param edits: Edits of the level from find_edits()
+        :param added: Changes of children numbers by n-grams
+        :param tokens: Vocabulary of the new model
+        :param starts: Sentence starts of the new model to append to
+        :return: New token IDs, weights and children pointers (if any)
+        """
+        old = [self.ids[level], self.weights[level], *self.children[level : level + 1]]
+        new = [array("q") for _ in old]
+        new_ids, new_weights, *new_pointers = new
+        is_starts_level = level == self.order - 2
+        cursor = group_end = weight_shift = pointer_shift = 0
+        group = None
+
+        def copy(end: int) -> None:
+            """
+            Copies unchanged nodes from cursor to end
+            """
+            if is_starts_level:
+                first = bisect_left(self.starts, cursor)
+                last = bisect_left(self.starts, end, first)
+                extend_shifted(starts, self.starts[first:last], len(new_ids) - cursor)
+            extend_shifted(new_ids, old[0][cursor:end], 0)
+            # Only siblings of the last changed node have shifted running sums
+            middle = max(cursor, min(end, group_end))
+            extend_shifted(new_weights, old[1][cursor:middle], weight_shift)
+            extend_shifted(new_weights, old[1][middle:end], 0)
+            if new_pointers:
+                extend_shifted(new_pointers[0], old[2][cursor:end], pointer_shift)
+
+        for ngram, node, exists, before, siblings_end, count, new_count in edits:
+            copy(node)
+            if ngram[:-1] != group:
+                group, group_end, weight_shift = ngram[:-1], siblings_end, 0
+            if new_pointers:
+                children_number = added[ngram]
+                if exists:
+                    children_number += old[2][node + 1] - old[2][node]
+                if children_number and not new_count:
+                    raise ValueError("Document was not added to the model")
+            if new_count:
+                new_ids.append(ngram[-1])
+                new_weights.append(before + weight_shift + new_count)
+            if new_count and new_pointers:
+                new_pointers[0].append(old[2][node] + pointer_shift)
+                if (
+                    is_starts_level
+                    and children_number
+                    and is_sentence_start(tokens[ngram[0]])
+                ):
+                    starts.append(len(new_ids) - 1)
+            weight_shift += new_count - count
+            pointer_shift += added[ngram]
+            cursor = node + exists
+        copy(len(old[0]))
+        if new_pointers:
+            new_pointers[0].append(old[2][-1] + pointer_shift)
+        return new
+
+    def find(self, context: Sequence[int]) -> int:
+        """
+        Walks down the trie by binary search among children
+
+        :param context: Token IDs
+        :return: Index of the context node on level len(context) - 1,
+            -1 if there is no such n-gram
+        """
+        node = -1
+        lo, hi = 0, len(self.ids[0])
+        for level, token_id in enumerate(context):
+            if level:
+                pointers = self.children[level - 1]
+                lo, hi = pointers[node], pointers[node + 1]
+            level_ids = self.ids[level]
+            node = bisect_left(level_ids, token_id, lo, hi)
+            if node == hi or level_ids[node] != token_id:
+                return -1
+        return node
+
+    def following(self, context: Sequence[int]) -> tuple:
+        """
+        Finds words following the longest known suffix of the context,
+        backs off to all words of the text if no suffix is followed by a word
+
+        :param context: Up to order - 1 token IDs
+        :return: (level, start, end), following words are nodes
+            start:end of the level
+        """
+        for skip in range(len(context)):
+            level = len(context) - skip - 1
+            node = self.find(context[skip:])
+            if node >= 0:
+                start, end = self.children[level][node : node + 2]
+                if start < end:
+                    return level + 1, start, end
+        return 0, 0, len(self.ids[0])
+
+    def context(self, level: int, node: int) -> tuple:
+        """
+        Walks up the trie from the node to the root
+
+        :param level:
+        :param node: Node index on the level
+        :return: Token IDs of the n-gram
+        """
+        context = [self.ids[level][node]]
+        for upper_level in range(level - 1, -1, -1):
+            node = bisect_right(self.children[upper_level], node) - 1
+            context.append(self.ids[upper_level][node])
+        return tuple(reversed(context))
+
+    def continuations(self, context: Sequence[int]) -> tuple:
+        """
+        :param context: Up to order - 1 token IDs
+        :return: Token IDs following the context (see following())
+            and their counts
+        """
+        level, start, end = self.following(context)
+        weights = self.weights[level][start:end]
+        counts = array("q", weights[:1])
+        counts.extend(map(sub, weights[1:], weights[:-1]))
+        return self.ids[level][start:end], counts
+
+    def choose(self, context: Sequence[int], point: float) -> int:
+        """
+        Chooses a word following the context with probability proportional
+        to its count
+
+        :param context: Up to order - 1 token IDs
+        :param point: Random number in [0, 1)
+        :return: Token ID
+        """
+        level, start, end = self.following(context)
+        weights = self.weights[level]
+        return self.ids[level][
+            bisect_right(weights, point * weights[end - 1], start, end)
+        ]
+
+    def choose_start(self, point: float) -> tuple:
+        """
+        Chooses uniformly one of the contexts which can start a sentence
+
+        :param point: Random number in [0, 1)
+        :return: order - 1 token IDs
+        """
+        if not self.starts:
+            raise ValueError("Model has no sentence starts")
+        return self.context(self.order - 2, self.starts[int(point * len(self.starts))])
+
+
+def count_ngrams(token_ids: Iterable[int], order: int) -> Counter:
+    """
+    Counts n-grams of all lengths up to order in one pass with a sliding
+    window, memory depends on the number of n-grams, not on the text length
+
+    :param token_ids: Token IDs of the text, may be a lazy iterator
+    :param order: Length of the longest n-grams
+    :return: Counts of n-grams
+    """
+    ngrams = Counter()
+    window = deque(maxlen=order)
+    for token_id in token_ids:
+        window.append(token_id)
+        ngram = tuple(window)
+        # Every suffix is an n-gram of lower order ending with the token
+        for start in range(len(ngram)):
+            ngrams[ngram[start:]] += 1
+    return ngrams
+
+
+def extend_shifted(target: array, values, shift: int) -> None:
+    """
+    Appends values increased by shift, unchanged values are copied as bytes
+
+    :param target:
+    :param values: Array or memoryview of integers
+    :param shift:
+    """
+    if shift:
+        target.extend(map(add, values, repeat(shift)))
+    else:
+        target.frombytes(memoryview(values).cast("B"))
+
+
+def is_sentence_start(token: str) -> bool:
+    """
+    :param token:
+    :return: True if the token is capitalized and doesn't end a sentence
+    """
+    return token[0].isupper() and token[-1] not in END_MARKERS
+
+
+def find_starts(tokens: list, ids: list, children: list) -> array:
+    """
+    :param tokens: Vocabulary
+    :param ids: Tokens of trie nodes by levels
+    :param children: Children pointers of trie nodes by levels
+    :return: Indexes of nodes of level order - 2 which are followed by words
+        and which first token can start a sentence
+    """
+    is_start = [is_sentence_start(token) for token in tokens]
+    flags = [is_start[token_id] for token_id in ids[0]]
+    # Children inherit the first token of their parent
+    for pointers in children[:-1]:
+        sizes = map(sub, pointers[1:], pointers[:-1])
+        flags = list(chain.from_iterable(map(repeat, flags, sizes)))
+    pointers = children[-1]
+    return array(
+        "q",
+        [
+            node
+            for node, flag in enumerate(flags)
+            if flag and pointers[node] < pointers[node + 1]
+        ],
+    )
+
+
+def read_tokens(text_file: TextIO) -> Iterator[str]:
+    """
+    Splits text into whitespace separated tokens reading it by chunks,
+    a token cut by the end of a chunk is carried over to the next one
+
+    :param text_file: Opened text file
+    :return: Generator of tokens
+    """
+    rest = ""
+    while True:
+        chunk = text_file.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        tokens = regexp_tokenize(rest + chunk, r"\S+")
+        rest = "" if chunk[-1].isspace() else tokens.pop()
+        yield from tokens
+    if rest:
+        yield rest
+
+
+def is_model(file_name: str) -> bool:
+    """
+    :param file_name:
+    :return: True if the file is a saved model
+    """
+    with open(file_name, "rb") as binary_file:
+        return binary_file.read(len(MODEL_MAGIC)) == MODEL_MAGIC
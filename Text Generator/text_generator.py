@@ -1,48 +1,228 @@
-from collections import Counter, defaultdict
-from random import choices
-from nltk.tokenize import regexp_tokenize
-from nltk import trigrams
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import islice, repeat
+from random import Random
+import sys
+from typing import Iterator, TextIO
 
+from markov import (
+    DEFAULT_ORDER,
+    END_MARKERS,
+    is_model,
+    MAX_ORDER,
+    MIN_ORDER,
+    Model,
+    read_tokens,
+)
 
-# Data input
-file_path = input()
-try:
+SENTENCES_NUMBER = 10
+MIN_WORDS = 5
+# Number of sentences generated by one task and written at once
+BLOCK_SENTENCES = 10_000
+
+
+def read_model(file_path: str, order: int = DEFAULT_ORDER) -> Model:
+    """
+    Loads saved model or builds it from the text
+
+    :param file_path: Saved model or text file
+    :param order: Length of the longest n-grams of a built model
+    :return: Model
+    """
+    if is_model(file_path):
+        return Model.load(file_path)
     with open(file_path, "r", encoding="utf-8") as text_file:
-        tokens = regexp_tokenize(text_file.read(), r"\S+")
-except OSError as error:
-    print(error)
+        return Model.build(read_tokens(text_file), order)
 
-# Get trigrams
-trigrams_ = list(trigrams(tokens))
 
-# Build Markov chain model
-chains = defaultdict(Counter)
-for head_1, head_2, tail in trigrams_:
-    chains[f"{head_1} {head_2}"][tail] += 1
+def update_model(model: Model, added: list, removed: list) -> Model:
+    """
+    :param model:
+    :param added: Text files to add counts of
+    :param removed: Text files added earlier to subtract counts of
+    :return: Updated model
+    """
+    for file_paths, subtract in ((added, False), (removed, True)):
+        for file_path in file_paths:
+            with open(file_path, "r", encoding="utf-8") as text_file:
+                model = model.update(read_tokens(text_file), subtract)
+    return model
 
-# Generate text
-SENTENCES_NUMBER = 10
-END_MARKERS = [".", "!", "?"]
-MIN_WORDS = 5
-for _ in range(SENTENCES_NUMBER):
-    sentence = ""
-    # Get the first word of the sentence
-    while True:
-        head = choices(list(chains.keys()))[0]
-        # Only capitalized and without sentence-ending punctuation marks
-        if (
-            head[0].isupper()
-            and head.split()[0][-1]
-            not in END_MARKERS  # Check end of the first word in head
-        ):
-            break
-    sentence += head
+
+@lru_cache(maxsize=1)
+def load_model(file_path: str) -> Model:
+    """
+    Maps saved model once per worker process, pages of the file are shared
+    by all workers
+
+    :param file_path: Saved model
+    :return: Model
+    """
+    return Model.load(file_path)
+
+
+def generate_sentence(model: Model, rnd: Random) -> str:
+    """
+    :param model:
+    :param rnd: Random numbers generator
+    :return: Sentence generated by the Markov chain
+    """
+    tokens = model.tokens
+    context_length = model.order - 1
+    # Get the first words of the sentence: capitalized and without
+    # sentence-ending punctuation marks
+    token_ids = list(model.choose_start(rnd.random()))
     # Get next words
     while True:
-        next_word = choices(tuple(chains[head].keys()), tuple(chains[head].values()))[0]
-        sentence += f" {next_word}"
+        next_id = model.choose(token_ids[-context_length:], rnd.random())
+        token_ids.append(next_id)
         # End sentence with punctuation mark after at least MIN_WORDS
-        if next_word[-1] in END_MARKERS and len(sentence.split()) >= MIN_WORDS:
+        if tokens[next_id][-1] in END_MARKERS and len(token_ids) >= MIN_WORDS:
             break
-        head = " ".join(sentence.split()[-2:])
-    print(sentence)
+    return " ".join([tokens[token_id] for token_id in token_ids])
+
+
+def generate_sentences(model: Model, seed=None) -> Iterator[str]:
+    """
+    Lazily generates an endless sequence of sentences
+
+    :param model:
+    :param seed: Seed of random numbers generator, same seed gives same text
+    :return: Generator of sentences
+    """
+    rnd = Random(seed)
+    while True:
+        yield generate_sentence(model, rnd)
+
+
+def generate_block(model: Model, number: int, seed) -> str:
+    """
+    :param model:
+    :param number: Number of sentences
+    :param seed: Seed of random numbers generator
+    :return: Sentences, each on its own line
+    """
+    return "".join(
+        f"{sentence}\n" for sentence in islice(generate_sentences(model, seed), number)
+    )
+
+
+def generate_saved_block(file_path: str, number: int, seed) -> str:
+    """
+    Generates block of sentences in a worker process
+
+    :param file_path: Saved model
+    :param number: Number of sentences
+    :param seed: Seed of random numbers generator
+    :return: Sentences, each on its own line
+    """
+    return generate_block(load_model(file_path), number, seed)
+
+
+def split_blocks(number: int, seed) -> tuple:
+    """
+    Splits text into blocks of BLOCK_SENTENCES sentences, each block has its
+    own random stream, so the text doesn't depend on the number of processes
+
+    :param number: Number of sentences
+    :param seed: Seed of the whole text, None for a random text
+    :return: (sizes of blocks, seeds of blocks)
+    """
+    starts = range(0, number, BLOCK_SENTENCES)
+    sizes = [min(BLOCK_SENTENCES, number - start) for start in starts]
+    if seed is None:
+        return sizes, [None] * len(sizes)
+    return sizes, [f"{seed}:{idx}" for idx in range(len(sizes))]
+
+
+def write_text(model: Model, number: int, text_file: TextIO, seed=None) -> None:
+    """
+    Writes sentences by blocks
+
+    :param model:
+    :param number: Number of sentences
+    :param text_file: Opened text file
+    :param seed: Seed of random numbers generator
+    """
+    sizes, seeds = split_blocks(number, seed)
+    text_file.writelines(map(generate_block, repeat(model), sizes, seeds))
+
+
+def write_text_parallel(
+    file_path: str, number: int, text_file: TextIO, seed=None, jobs: int = None
+) -> None:
+    """
+    Generates blocks of sentences in a process pool, every worker maps the
+    saved model instead of receiving a copy. Blocks are written in order
+
+    :param file_path: Saved model
+    :param number: Number of sentences
+    :param text_file: Opened text file
+    :param seed: Seed of random numbers generator
+    :param jobs: Number of worker processes, all CPU cores by default
+    """
+    sizes, seeds = split_blocks(number, seed)
+    with ProcessPoolExecutor(jobs) as executor:
+        text_file.writelines(
+            executor.map(generate_saved_block, repeat(file_path), sizes, seeds)
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Markov chain text generator")
+    parser.add_argument("input", nargs="?", help="Text file or saved model")
+    parser.add_argument(
+        "-o", "--output", help="Save model to the file instead of generating text"
+    )
+    parser.add_argument(
+        "-n",
+        "--sentences",
+        type=int,
+        default=SENTENCES_NUMBER,
+        help="Number of sentences",
+    )
+    parser.add_argument(
+        "--order",
+        type=int,
+        default=DEFAULT_ORDER,
+        choices=range(MIN_ORDER, MAX_ORDER + 1),
+        help="Length of n-grams of a model built from text",
+    )
+    parser.add_argument(
+        "--add",
+        action="append",
+        default=[],
+        metavar="FILE",
+        help="Add counts of the text to the model",
+    )
+    parser.add_argument(
+        "--remove",
+        action="append",
+        default=[],
+        metavar="FILE",
+        help="Subtract counts of the text added to the model earlier",
+    )
+    parser.add_argument("--seed", help="Seed of random numbers generator")
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=0, help="Number of generating processes"
+    )
+    args = parser.parse_args()
+    file_path = input() if args.input is None else args.input
+    updated = args.add or args.remove
+    try:
+        if args.jobs and not args.output and (updated or not is_model(file_path)):
+            parser.error("parallel mode needs a saved model")
+        model = read_model(file_path, args.order)
+        model = update_model(model, args.add, args.remove)
+    except OSError as error:
+        print(error)
+        sys.exit(1)
+    except ValueError as error:
+        parser.error(str(error))
+    if args.output:
+        model.save(args.output)
+    elif args.jobs:
+        write_text_parallel(file_path, args.sentences, sys.stdout, args.seed, args.jobs)
+    else:
+        write_text(model, args.sentences, sys.stdout, args.seed)